@@ -0,0 +1,49 @@
+"""Run deebee benchmarks and compare them against a baseline.
+
+    python -m benchmarks                          run all and write benchmarks/results.json
+    python -m benchmarks -k "^sql\\."              run only the benchmarks matching a pattern
+    python -m benchmarks --save-baseline          store the results as the baseline
+    python -m benchmarks --threshold 0.2          fail when a median is 20% slower than the baseline
+
+The exit status is 1 when any benchmark regressed against the baseline.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+from benchmarks import suite  # noqa: F401, registers the benchmarks
+from benchmarks.runner import compare, format_time, load, run_all, save
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run deebee benchmarks.')
+    parser.add_argument('-k', '--pattern', default='', help='run only benchmarks whose name matches the regex')
+    parser.add_argument('-o', '--output', default=os.path.join(DIRECTORY, 'results.json'), help='results file')
+    parser.add_argument('-b', '--baseline', default=os.path.join(DIRECTORY, 'baseline.json'), help='baseline file')
+    parser.add_argument('-t', '--threshold', type=float, default=0.1, help='allowed slowdown fraction')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds by timed round')
+    parser.add_argument('--repeat', type=int, default=5, help='timed rounds by benchmark')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to the baseline file')
+    args = parser.parse_args(argv)
+
+    document = asyncio.run(run_all(args.pattern, min_time=args.min_time, repeat=args.repeat))
+    save(document, args.output)
+    if args.save_baseline:
+        save(document, args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        return 0
+    regressions = 0
+    print(f'\n{"benchmark":<60} {"baseline":>12} {"current":>12} {"change":>8}')
+    for name, before, after, ratio, regressed in compare(document, load(args.baseline), args.threshold):
+        regressions += regressed
+        flag = '  REGRESSED' if regressed else ''
+        print(f'{name:<60} {format_time(before):>12} {format_time(after):>12} {ratio - 1:>+8.1%}{flag}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import asyncio
+
+from deebee.connection import Cursor as BaseCursor
+
+dialect = 'postgresql'
+returning = True
+executemany = True
+paramstyle = 'format'
+
+result = {'columns': ['id'], 'rows': [(1,)]}
+
+
+def set_result(columns: list, rows: list):
+    """Set the columns and rows returned by every statement executed on fake connections.
+
+    :param columns:
+    :param rows:
+    :return:
+    """
+    result['columns'] = list(columns)
+    result['rows'] = list(rows)
+
+
+class FakeConnection:
+    def __init__(self, latency: float = 0):
+        """In memory connection that answers every statement with the result set, after latency seconds.
+
+        :param latency: seconds each statement takes, to simulate the round trip to server.
+        """
+        self.latency = latency
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, con: FakeConnection):
+        self.con = con
+        self.description = None
+        self.rowcount = -1
+        self.rows = []
+        self.position = 0
+
+    async def execute(self, sql, params=None):
+        if self.con.latency:
+            await asyncio.sleep(self.con.latency)
+        self.description = [(column, None) for column in result['columns']]
+        self.rows = result['rows']
+        self.rowcount = len(self.rows)
+        self.position = 0
+
+    async def executemany(self, sql, seq_of_params):
+        for params in seq_of_params:
+            await self.execute(sql, params)
+        self.rowcount = len(seq_of_params)
+
+    async def fetchone(self):
+        if self.position >= len(self.rows):
+            return None
+        self.position += 1
+        return self.rows[self.position - 1]
+
+    async def fetchmany(self, size: int):
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+    async def fetchall(self):
+        rows = self.rows[self.position:]
+        self.position = len(self.rows)
+        return rows
+
+    def close(self):
+        self.rows = []
+
+
+async def get_connection(latency: float = 0, **params):
+    return FakeConnection(latency=latency)
+
+
+async def cursor(con):
+    return BaseCursor(FakeCursor(con))
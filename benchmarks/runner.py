@@ -0,0 +1,164 @@
+import contextlib
+import inspect
+import itertools
+import json
+import platform
+import re
+import statistics
+import sys
+import time
+from typing import Callable
+
+benchmarks: dict[str, tuple[Callable, dict]] = {}
+
+
+def benchmark(name: str, **variants):
+    """Register a benchmark run once to each combination of variant values.
+
+    The decorated function is an async context manager factory receiving one value of each variant and yielding
+    the operation measured, a function or coroutine function without arguments. Setup runs before the yield
+    and cleanup after it, both out of the measured time.
+
+        @benchmark('e2e.select', rows=[10, 1000])
+        async def select(rows):
+            ...
+            yield lambda: db.select(sql)
+
+    :param name:
+    :param variants: variant name and list of values.
+    :return:
+    """
+    def decorator(fn):
+        benchmarks[name] = (contextlib.asynccontextmanager(fn), variants)
+        return fn
+    return decorator
+
+
+def expand(name: str, variants: dict):
+    """Yield the full name and params of each variant combination."""
+    keys = list(variants)
+    for values in itertools.product(*(variants[k] for k in keys)):
+        params = dict(zip(keys, values))
+        label = ','.join(f'{k}={v}' for k, v in params.items())
+        yield (f'{name}[{label}]' if label else name), params
+
+
+async def measure(
+        op: Callable,
+        min_time: float = 0.2,
+        repeat: int = 5
+) -> dict:
+    """Time op and return the seconds by call statistics.
+
+    The number of calls by round grows until a round lasts min_time, then repeat rounds are timed.
+
+    :param op:
+    :param min_time:
+    :param repeat:
+    :return:
+    """
+    probe = op()
+    is_async = inspect.isawaitable(probe)
+    if is_async:
+        await probe
+
+    async def run(number):
+        if is_async:
+            start = time.perf_counter()
+            for _ in range(number):
+                await op()
+            return time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        return time.perf_counter() - start
+
+    number = 1
+    while (elapsed := await run(number)) < min_time:
+        number = max(number * 2, int(number * min_time / elapsed) + 1) if elapsed else number * 10
+    times = [await run(number) / number for _ in range(repeat)]
+    return {
+        'number': number,
+        'repeat': repeat,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'ops': 1 / statistics.median(times),
+    }
+
+
+async def run_all(
+        pattern: str = '',
+        min_time: float = 0.2,
+        repeat: int = 5,
+        output=sys.stderr
+) -> dict:
+    """Run registered benchmarks whose full name matches pattern and return the results document.
+
+    :param pattern: regular expression searched in benchmark full names.
+    :param min_time:
+    :param repeat:
+    :param output: stream where progress is written, None to be quiet.
+    :return:
+    """
+    results = {}
+    for name, (factory, variants) in benchmarks.items():
+        for full_name, params in expand(name, variants):
+            if pattern and not re.search(pattern, full_name):
+                continue
+            async with factory(**params) as op:
+                result = await measure(op, min_time=min_time, repeat=repeat)
+            results[full_name] = {'params': params, **result}
+            if output:
+                print(f'{full_name:<60} {format_time(result["median"]):>12} {result["ops"]:>14,.1f} ops/s', file=output)
+    return {
+        'version': 1,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': results,
+    }
+
+
+def compare(
+        current: dict,
+        baseline: dict,
+        threshold: float = 0.1
+) -> list:
+    """Compare median times of benchmarks present in both documents.
+
+    Returns a list of (name, baseline median, current median, ratio, regressed) tuples, where regressed is set
+    when current median is slower than baseline by more than threshold.
+
+    :param current:
+    :param baseline:
+    :param threshold: allowed slowdown fraction, 0.1 means 10%.
+    :return:
+    """
+    rows = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['median'] / base['median']
+        rows.append((name, base['median'], result['median'], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
+
+
+def load(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def save(document: dict, path: str):
+    with open(path, 'w') as file:
+        json.dump(document, file, indent=2, sort_keys=True)
+        file.write('\n')
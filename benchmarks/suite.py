@@ -0,0 +1,136 @@
+import asyncio
+import os
+import tempfile
+
+from deebee import DB, Pool, register_backend
+from deebee.db import identify_operator
+
+from benchmarks import fake
+from benchmarks.runner import benchmark
+
+register_backend('fake', fake)
+
+COLUMNS = ['id', 'name', 'email', 'score', 'active']
+
+
+def make_records(count: int) -> list:
+    return [{'id': i, 'name': f'name {i}', 'email': f'user{i}@mail.com', 'score': i * 0.5, 'active': i % 2}
+            for i in range(count)]
+
+
+async def open_db(backend: str, max_size: int = 10) -> tuple[DB, callable]:
+    """Return a DB to backend with a users table and a function that closes it."""
+    if backend == 'fake':
+        db = DB(Pool('fake', max_size=max_size))
+
+        async def close():
+            await db.close()
+        return db, close
+    directory = tempfile.TemporaryDirectory()
+    db = DB(Pool('sqlite', params={'database': os.path.join(directory.name, 'bench.db')}, max_size=max_size))
+    await db.execute('create table users (id integer primary key, name text, email text, score real, active integer)')
+
+    async def close():
+        await db.close()
+        directory.cleanup()
+    return db, close
+
+
+@benchmark('sql.query', conditions=[1, 5, 20])
+async def sql_query(conditions):
+    db = DB(Pool('fake'))
+    operators = [('gt', 1), ('starts', 'a'), ('between', (1, 9)), ('in', [1, 2, 3]), ('', 1)]
+    where = {}
+    for i in range(conditions):
+        code, value = operators[i % len(operators)]
+        where[f'column{i}__{code}' if code else f'column{i}'] = value
+    yield lambda: db._DB__generate_query_sql('users', db._DB__params(), where=where, order='id')
+
+
+@benchmark('sql.insert', rows=[1, 100, 1000])
+async def sql_insert(rows):
+    db = DB(Pool('fake'))
+    data = make_records(rows)
+    yield lambda: db._DB__generate_insert_command('users', data, db._DB__params())
+
+
+@benchmark('sql.set', columns=[5, 50])
+async def sql_set(columns):
+    db = DB(Pool('fake'))
+    data = {f'column{i}': i for i in range(columns)}
+    yield lambda: db._DB__generate_set_section(db._DB__params(), data)
+
+
+@benchmark('sql.identify_operator', cached=[True, False])
+async def sql_identify_operator(cached):
+    identify = identify_operator if cached else identify_operator.__wrapped__
+    keys = ['id', 'id__gt', 'id__in', 'name__starts', 'tags__contains', 'score__between']
+
+    def op():
+        for key in keys:
+            identify(key)
+    yield op
+
+
+@benchmark('rows.materialize', rows=[10, 1000, 10000], row_format=['dict', 'tuple', 'record'])
+async def rows_materialize(rows, row_format):
+    db = DB(Pool('fake', max_size=1))
+    fake.set_result(COLUMNS, [tuple(record.values()) for record in make_records(rows)])
+    yield lambda: db.select('select * from users', row_format=row_format)
+    await db.close()
+
+
+@benchmark('pool.acquire_release', concurrency=[1, 10, 100])
+async def pool_acquire_release(concurrency):
+    pool = Pool('fake', max_size=10)
+    await pool.initialize()
+
+    async def use():
+        con = await pool.acquire()
+        await asyncio.sleep(0)
+        await pool.release(con)
+
+    async def op():
+        await asyncio.gather(*(use() for _ in range(concurrency)))
+    yield op
+    await pool.close()
+
+
+@benchmark('e2e.select', backend=['fake', 'sqlite'], rows=[10, 1000], concurrency=[1, 10])
+async def e2e_select(backend, rows, concurrency):
+    db, close = await open_db(backend)
+    records = make_records(rows)
+    fake.set_result(COLUMNS, [tuple(record.values()) for record in records])
+    if backend == 'sqlite':
+        await db.bulk_insert('users', records)
+
+    async def op():
+        await asyncio.gather(*(db.get_list('users', where={'id__gte': 0}, page=None) for _ in range(concurrency)))
+    yield op
+    await close()
+
+
+@benchmark('e2e.insert', backend=['fake', 'sqlite'], rows=[1, 100], concurrency=[1, 10])
+async def e2e_insert(backend, rows, concurrency):
+    db, close = await open_db(backend)
+    fake.set_result(COLUMNS, [tuple(make_records(1)[0].values())])
+    data = make_records(rows)
+    ids = iter(range(10 ** 9))
+
+    async def insert():
+        batch = [{**record, 'id': next(ids)} for record in data]
+        await db.insert('users', data=batch[0] if rows == 1 else batch)
+
+    async def op():
+        await asyncio.gather(*(insert() for _ in range(concurrency)))
+    yield op
+    await close()
+
+
+@benchmark('e2e.apply', backend=['fake', 'sqlite'], rows=[1, 100, 1000])
+async def e2e_apply(backend, rows):
+    db, close = await open_db(backend)
+    data = make_records(rows)
+    fake.set_result(COLUMNS, [tuple(record.values()) for record in data])
+    yield lambda: db.apply('users', key='id', data=data[0] if rows == 1 else data)
+    await close()
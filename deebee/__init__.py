@@ -1,4 +1,13 @@
+from .backends import register_backend
+from .cache import ResultCache
 from .db import DB
+from .errors import QueryTimeout
+from .metrics import MetricsRegistry, SlowQueryLog, prometheus_text
+from .pool import Pool
+from .schema import TableSchema
 
 
-__all__ = ['DB']
+__all__ = [
+    'DB', 'MetricsRegistry', 'Pool', 'QueryTimeout', 'ResultCache', 'SlowQueryLog', 'TableSchema', 'prometheus_text',
+    'register_backend'
+]
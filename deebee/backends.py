@@ -0,0 +1,48 @@
+import importlib
+import os
+from types import ModuleType
+from typing import Union
+
+
+backends: dict[str, Union[str, ModuleType]] = {
+    'sqlite': 'deebee.connectors.sqlite',
+    'postgresql': 'deebee.connectors.postgresql',
+    'asyncpg': 'deebee.connectors.asyncpg',
+    'mysql': 'deebee.connectors.mysql',
+}
+
+
+def register_backend(
+        name: str,
+        connector: Union[str, ModuleType]
+):
+    """Register a connector to be used by pools with given backend name.
+
+    The connector may be a module or its import path, which is only imported when first used.
+
+    :param name:
+    :param connector:
+    :return:
+    """
+    backends[name] = connector
+
+
+def get_backend(
+        name: str = None
+) -> ModuleType:
+    """Return the connector registered to backend name.
+
+    When no name is given, DEEBEE_TYPE environment variable is used and sqlite is the default.
+
+    :param name:
+    :return:
+    """
+    name = name or os.environ.get('DEEBEE_TYPE', 'sqlite')
+    try:
+        connector = backends[name]
+    except KeyError:
+        raise Exception(f'Backend {name} is not registered') from None
+    if isinstance(connector, str):
+        connector = importlib.import_module(connector)
+        backends[name] = connector
+    return connector
@@ -0,0 +1,86 @@
+import asyncio
+
+
+class Batch:
+    def __init__(self, db):
+        """Collect independent statements and run them together when the batch context ends.
+
+        Each method queues a call of the DB method with the same name and returns a future resolved with its
+        result, or its error, after the context ends. Statements run concurrently on pool connections, so the
+        batch takes about the time of its slowest statement instead of the sum of all. Inside a transaction or
+        pinned connection they run one after the other on that connection.
+
+            async with db.batch() as b:
+                users = b.count('users')
+                user = b.get_item('users', key='id', pk=1)
+                total = b.value('select sum(amount) from orders')
+            print(users.result(), user.result(), total.result())
+
+        :param db: DB used to run the statements.
+        """
+        self.db = db
+        self.calls: list[tuple] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        calls, self.calls = self.calls, []
+        if exc_type is not None:
+            for *_, future in calls:
+                future.cancel()
+            return
+        await self.run(calls)
+
+    async def run(self, calls: list):
+        """Run queued calls and resolve their futures.
+
+        :param calls: list of (method name, args, kwargs, future).
+        :return:
+        """
+        coroutines = [getattr(self.db, name)(*args, **kwargs) for name, args, kwargs, _ in calls]
+        if self.db.pinned:
+            results = []
+            for coroutine in coroutines:
+                try:
+                    results.append(await coroutine)
+                except Exception as e:
+                    results.append(e)
+        else:
+            results = await asyncio.gather(*coroutines, return_exceptions=True)
+        for (*_, future), result in zip(calls, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def select(self, sql: str, **kwargs) -> asyncio.Future:
+        return self.__add('select', sql, **kwargs)
+
+    def row(self, sql: str, **kwargs) -> asyncio.Future:
+        return self.__add('row', sql, **kwargs)
+
+    def value(self, sql: str, **kwargs) -> asyncio.Future:
+        return self.__add('value', sql, **kwargs)
+
+    def execute(self, sql: str, **kwargs) -> asyncio.Future:
+        return self.__add('execute', sql, **kwargs)
+
+    def get_list(self, table: str, **kwargs) -> asyncio.Future:
+        return self.__add('get_list', table, **kwargs)
+
+    def get_item(self, table: str, **kwargs) -> asyncio.Future:
+        return self.__add('get_item', table, **kwargs)
+
+    def count(self, table: str, **kwargs) -> asyncio.Future:
+        return self.__add('count', table, **kwargs)
+
+    def array(self, table: str, **kwargs) -> asyncio.Future:
+        return self.__add('array', table, **kwargs)
+
+    def __add(self, name: str, *args, **kwargs) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.calls.append((name, args, kwargs, future))
+        return future
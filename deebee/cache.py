@@ -0,0 +1,200 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 128):
+        """Keeps the most recently used items up to maxsize.
+
+        :param maxsize: number of items kept, zero disables the cache.
+        """
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key) -> bool:
+        return key in self.data
+
+    def get(self, key, default=None):
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> list:
+        """Store the value and return the evicted ones.
+
+        :param key:
+        :param value:
+        :return:
+        """
+        if self.maxsize <= 0:
+            return [value]
+        self.data[key] = value
+        self.data.move_to_end(key)
+        evicted = []
+        while len(self.data) > self.maxsize:
+            evicted.append(self.data.popitem(last=False)[1])
+        return evicted
+
+    def pop(self, key, default=None):
+        return self.data.pop(key, default)
+
+    def clear(self):
+        self.data.clear()
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.data), 'maxsize': self.maxsize}
+
+
+class ResultCache:
+    def __init__(
+            self,
+            maxsize: int = 1024,
+            ttl: float = 60,
+            table_ttls: dict = None
+    ):
+        """Read-through cache of query results invalidated by table.
+
+        Entries expire after their ttl and the least recently used ones are evicted when maxsize is reached.
+        Writes made by DB helpers invalidate every entry read from the written table. Concurrent misses of
+        the same key share a single query.
+
+        :param maxsize: number of results kept.
+        :param ttl: default seconds a result is kept.
+        :param table_ttls: seconds a result is kept by table, overriding the default ttl.
+        """
+        self.ttl = ttl
+        self.table_ttls = table_ttls or {}
+        self.entries = LRUCache(maxsize)
+        self.tables: dict[str, set] = {}
+        self.generations: dict[str, int] = {}
+        self.loading: dict = {}
+
+    @property
+    def hits(self) -> int:
+        return self.entries.hits
+
+    @property
+    def misses(self) -> int:
+        return self.entries.misses
+
+    def get(self, key):
+        """Return the cached value or None when missing or expired.
+
+        :param key:
+        :return:
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, table, _, value = entry
+        if expires < time.monotonic():
+            self.__discard(key, table)
+            return None
+        return value
+
+    def put(
+            self,
+            key,
+            value,
+            table: str,
+            ttl: float = None
+    ):
+        """Store a value read from table.
+
+        :param key:
+        :param value:
+        :param table:
+        :param ttl: seconds to keep the value, by default the table or cache ttl.
+        :return:
+        """
+        if ttl is None:
+            ttl = self.table_ttls.get(table, self.ttl)
+        for _, evicted_table, evicted_key, _ in self.entries.put(key, (time.monotonic() + ttl, table, key, value)):
+            self.__discard(evicted_key, evicted_table, pop=False)
+        self.tables.setdefault(table, set()).add(key)
+
+    async def fetch(
+            self,
+            key,
+            table: str,
+            load: Callable[[], Awaitable],
+            ttl: float = None
+    ):
+        """Return the cached value or load it, sharing one load between concurrent callers.
+
+        Values loaded while the table is invalidated are returned but not stored, and callers coming after the
+        invalidation start a new load.
+
+        :param key:
+        :param table:
+        :param load: coroutine function that queries the value.
+        :param ttl:
+        :return:
+        """
+        try:
+            value = self.get(key)
+        except TypeError:
+            return await load()
+        if value is not None:
+            return copy_result(value)
+        generation = self.generations.get(table, 0)
+        task = self.loading.get((key, generation))
+        if task is None:
+            task = asyncio.ensure_future(self.__load(key, table, generation, load, ttl))
+            self.loading[(key, generation)] = task
+        return copy_result(await asyncio.shield(task))
+
+    def invalidate(self, table: str):
+        """Drop all results read from table, including the ones being loaded.
+
+        :param table:
+        :return:
+        """
+        self.generations[table] = self.generations.get(table, 0) + 1
+        for key in self.tables.pop(table, ()):
+            self.entries.pop(key)
+
+    def clear(self):
+        for table in list(self.tables):
+            self.invalidate(table)
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return self.entries.stats()
+
+    async def __load(self, key, table, generation, load, ttl):
+        try:
+            value = await load()
+        finally:
+            self.loading.pop((key, generation), None)
+        if value is not None and generation == self.generations.get(table, 0):
+            self.put(key, value, table, ttl)
+        return value
+
+    def __discard(self, key, table, pop=True):
+        if pop:
+            self.entries.pop(key)
+        keys = self.tables.get(table)
+        if keys:
+            keys.discard(key)
+
+
+def copy_result(value):
+    """Return a copy of lists and dicts, so callers changing a result do not change the cached one."""
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    if isinstance(value, dict):
+        return {k: list(v) if isinstance(v, list) else v for k, v in value.items()}
+    return value
@@ -1,32 +1,250 @@
-import os
+import asyncio
+import contextlib
+import inspect
+import itertools
+import time
 
-kind = os.environ.get('DEEBEE_TYPE', 'sqlite')
-match kind:
-    case 'sqlite':
-        from deebee.connectors import sqlite as connector
-    case 'postgresql':
-        from deebee.connectors import postgresql as connector
-    case 'mysql':
-        from deebee.connectors import mysql as connector
+from deebee.backends import get_backend
+from deebee.cache import LRUCache
+
+
+async def maybe_await(value):
+    if inspect.isawaitable(value):
+        return await value
+    return value
 
 
 class Cursor:
-    def close(self):
-        ...
+    def __init__(self, cur):
+        """Wraps the cursor of DB-API like async drivers.
+
+        Connectors whose drivers differ from DB-API subclass it to keep the same interface.
+
+        :param cur: driver cursor.
+        """
+        self.cur = cur
+
+    @property
+    def description(self):
+        return self.cur.description
+
+    @property
+    def rowcount(self) -> int:
+        return self.cur.rowcount
+
+    async def execute(self, sql, params=None, timeout=None):
+        if timeout is None:
+            await self.cur.execute(sql, params or None)
+        else:
+            await asyncio.wait_for(self.cur.execute(sql, params or None), timeout)
+
+    async def executemany(self, sql, seq_of_params):
+        await self.cur.executemany(sql, seq_of_params)
+
+    async def fetchone(self):
+        return await self.cur.fetchone()
+
+    async def fetchmany(self, size: int):
+        return await self.cur.fetchmany(size)
+
+    async def fetchall(self):
+        return await self.cur.fetchall()
+
+    async def close(self):
+        await maybe_await(self.cur.close())
 
 
 class Connection:
-    def __init__(self, pool=None):
+    def __init__(self, pool=None, backend: str = None):
+        """Connection to database by backend connector.
+
+        :param pool: pool which the connection belongs to, its connector and params are used.
+        :param backend: backend name used when there is no pool.
+        """
         self.con = None
         self.pool = pool
-        self.closed: bool = False
+        self.connector = pool.connector if pool else get_backend(backend)
+        self.statements = LRUCache(getattr(pool, 'statement_cache_size', 100))
+        self.created: float = 0.0
+        self.last_used: float = 0.0
+        self.queries: int = 0
+        self.cancel_key = None
+        self.__statement_ids = itertools.count(1)
+        self.__closed: bool = False
+
+    @property
+    def closed(self) -> bool:
+        if self.__closed:
+            return True
+        if self.con is not None and hasattr(self.connector, 'is_closed'):
+            return self.connector.is_closed(self.con)
+        return bool(getattr(self.con, 'closed', False))
 
     async def initialize(self):
-        self.con = await connector.get_connection()
+        params = getattr(self.pool, 'params', None) or {}
+        self.con = await self.connector.get_connection(**params)
+        self.created = self.last_used = time.monotonic()
+        if hasattr(self.connector, 'cancel_key'):
+            self.cancel_key = self.connector.cancel_key(self.con)
+
+    async def cursor(self) -> Cursor:
+        self.queries += 1
+        return await self.connector.cursor(self.con)
+
+    async def ping(
+            self,
+            timeout: float = None
+    ) -> bool:
+        """Return if the connection still answers the server.
+
+        Connectors may provide a cheaper ping, the others run select 1.
+
+        :param timeout: seconds to wait for the answer.
+        :return:
+        """
+        if self.closed:
+            return False
+        try:
+            if hasattr(self.connector, 'ping'):
+                await asyncio.wait_for(self.connector.ping(self.con), timeout)
+            else:
+                cur = await self.connector.cursor(self.con)
+                try:
+                    await cur.execute('select 1', timeout=timeout)
+                    await cur.fetchall()
+                finally:
+                    await cur.close()
+        except (Exception, asyncio.TimeoutError):
+            return False
+        return True
+
+    async def execute(
+            self,
+            sql: str,
+            params=None
+    ) -> int:
+        """Execute a command without results and return the number of rows affected.
+
+        :param sql:
+        :param params:
+        :return:
+        """
+        cur = await self.cursor()
+        try:
+            await cur.execute(sql, params)
+            return cur.rowcount
+        finally:
+            await cur.close()
+
+    async def executemany(
+            self,
+            sql: str,
+            seq_of_params: list
+    ) -> int:
+        """Execute a command once to each params in seq_of_params.
+
+        :param sql:
+        :param seq_of_params:
+        :return:
+        """
+        cur = await self.cursor()
+        try:
+            await cur.executemany(sql, seq_of_params)
+            return len(seq_of_params)
+        finally:
+            await cur.close()
+
+    async def copy(
+            self,
+            table: str,
+            columns: list,
+            records: list
+    ) -> int:
+        """Copy records to table through the bulk load protocol of connector.
+
+        :param table:
+        :param columns:
+        :param records:
+        :return:
+        """
+        return await self.connector.copy(self.con, table, columns, records)
+
+    async def stream(
+            self,
+            sql: str,
+            params=None,
+            batch_size: int = 1000
+    ):
+        """Yield the columns and a batch of rows until the query result ends.
+
+        Connectors with server side cursors provide their own stream, the others fetch rows with fetchmany.
+
+        :param sql:
+        :param params:
+        :param batch_size:
+        :return:
+        """
+        if hasattr(self.connector, 'stream'):
+            self.queries += 1
+            async with contextlib.aclosing(self.connector.stream(self.con, sql, params, batch_size)) as batches:
+                async for batch in batches:
+                    yield batch
+            return
+        cur = await self.cursor()
+        try:
+            await cur.execute(sql, params)
+            columns = [col[0] for col in cur.description]
+            while rows := await cur.fetchmany(batch_size):
+                yield columns, rows
+        finally:
+            await cur.close()
+
+    async def prepare(self, sql: str):
+        """Return the statement prepared on server to given sql.
+
+        Prepared statements are kept by connection in a LRU cache keyed by sql, so the same query
+        shape is parsed and planned only once. Connectors without support to prepare return the sql itself.
+
+        :param sql:
+        :return:
+        """
+        if not self.statements.maxsize or not hasattr(self.connector, 'prepare'):
+            return sql
+        statement = self.statements.get(sql)
+        if statement is None:
+            statement = await self.connector.prepare(self.con, f'deebee_{next(self.__statement_ids)}', sql)
+            for evicted in self.statements.put(sql, statement):
+                await self.connector.deallocate(self.con, evicted)
+        return statement
+
+    async def cancel(self) -> bool:
+        """Stop the statement running on server and return if the connection was reset to be reused.
+
+        It is used after a statement times out or its task is cancelled. The connection is kept when the
+        connector cancels the statement and the connection answers a ping afterwards, otherwise it is closed.
+
+        :return:
+        """
+        if hasattr(self.connector, 'cancel') and self.con is not None:
+            params = dict(getattr(self.pool, 'params', None) or {})
+            try:
+                await self.connector.cancel(self.con, self.cancel_key, params)
+                if not self.closed and await self.ping(getattr(self.pool, 'ping_timeout', 1.0)):
+                    return True
+            except Exception:
+                pass
+        await self.close()
+        return False
 
-    async def cursor(self):
-        return await self.con.cursor()
+    async def release(self):
+        if self.pool:
+            await self.pool.release(self)
+        else:
+            await self.close()
 
     async def close(self):
-        await self.con.close()
-        self.closed = True
+        if self.__closed:
+            return
+        self.__closed = True
+        if self.con is not None:
+            await maybe_await(self.con.close())
@@ -0,0 +1,161 @@
+import contextlib
+import weakref
+
+from deebee.cache import LRUCache
+from deebee.connection import Cursor as BaseCursor
+from deebee.connectors.postgresql import get_connection_string, get_db_params, get_dsn
+
+dialect = 'postgresql'
+returning = True
+executemany = True
+paramstyle = 'numeric'
+
+STATEMENT_CACHE_SIZE = 256
+
+_statements = weakref.WeakKeyDictionary()
+
+
+async def prepare_cached(con, sql):
+    """Return the statement prepared to sql on connection, kept in a LRU cache by connection.
+
+    asyncpg prepare bypasses its own statement cache, so statements run by cursors are cached here to be
+    parsed by server only once by connection.
+    """
+    cache = _statements.get(con)
+    if cache is None:
+        cache = _statements[con] = LRUCache(STATEMENT_CACHE_SIZE)
+    statement = cache.get(sql)
+    if statement is None:
+        statement = await con.prepare(sql)
+        cache.put(sql, statement)
+    return statement
+
+
+class Cursor(BaseCursor):
+    def __init__(self, con):
+        """Cursor interface over asyncpg connection.
+
+        Statements are executed as prepared statements through binary protocol, cached by connection, and all
+        rows returned are kept by cursor to be read by fetch methods. Use stream to read rows in batches.
+
+        :param con: asyncpg connection.
+        """
+        super().__init__(None)
+        self.con = con
+        self.rows = []
+        self.position = 0
+        self.columns = None
+        self.count = -1
+
+    @property
+    def description(self):
+        return self.columns
+
+    @property
+    def rowcount(self) -> int:
+        return self.count
+
+    async def execute(self, sql, params=None, timeout=None):
+        import asyncpg
+
+        if hasattr(sql, 'fetch'):
+            statement = sql
+            self.rows = await statement.fetch(*(params or ()), timeout=timeout)
+        else:
+            statement = await prepare_cached(self.con, sql)
+            try:
+                self.rows = await statement.fetch(*(params or ()), timeout=timeout)
+            except (asyncpg.InvalidCachedStatementError, asyncpg.OutdatedSchemaCacheError):
+                _statements[self.con].pop(sql)
+                if self.con.is_in_transaction():
+                    raise
+                statement = await prepare_cached(self.con, sql)
+                self.rows = await statement.fetch(*(params or ()), timeout=timeout)
+        self.position = 0
+        attributes = statement.get_attributes()
+        self.columns = [(attr.name, attr.type.name) for attr in attributes] if attributes else None
+        status = statement.get_statusmsg() or ''
+        count = status.rsplit(' ', 1)[-1]
+        self.count = int(count) if count.isdigit() else len(self.rows)
+
+    async def executemany(self, sql, seq_of_params):
+        await self.con.executemany(sql, seq_of_params)
+        self.count = len(seq_of_params)
+
+    async def fetchone(self):
+        if self.position >= len(self.rows):
+            return None
+        self.position += 1
+        return self.rows[self.position - 1]
+
+    async def fetchmany(self, size: int):
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+    async def fetchall(self):
+        rows = self.rows[self.position:]
+        self.position = len(self.rows)
+        return rows
+
+    async def close(self):
+        self.rows = []
+
+
+async def get_connection(**params):
+    import asyncpg
+
+    if params:
+        if params.get('port'):
+            params['port'] = int(params['port'])
+        return await asyncpg.connect(**params)
+    con = await asyncpg.connect(get_connection_string())
+    return con
+
+
+def is_closed(con) -> bool:
+    return con.is_closed()
+
+
+def is_data_error(error: Exception) -> bool:
+    """Return if error was raised by the values of a row, like a constraint violated or an invalid value."""
+    import asyncpg
+
+    return isinstance(error, (asyncpg.IntegrityConstraintViolationError, asyncpg.DataError))
+
+
+async def cursor(con):
+    return Cursor(con)
+
+
+async def stream(con, sql, params, batch_size):
+    """Fetch query rows in batches through a server side cursor inside a transaction.
+
+    A transaction is only opened when the connection is not already in one.
+    """
+    async with contextlib.AsyncExitStack() as stack:
+        if not con.is_in_transaction():
+            await stack.enter_async_context(con.transaction())
+        statement = await con.prepare(sql)
+        columns = [attr.name for attr in statement.get_attributes()]
+        cur = await statement.cursor(*(params or ()))
+        while rows := await cur.fetch(batch_size):
+            yield columns, rows
+
+
+async def prepare(con, name, sql):
+    return await con.prepare(sql)
+
+
+async def deallocate(con, statement):
+    """Prepared statements are closed by asyncpg when they are garbage collected."""
+
+
+async def copy(con, table, columns, records):
+    """Load records with COPY FROM STDIN in binary format."""
+    status = await con.copy_records_to_table(table, records=records, columns=columns)
+    return int(status.rsplit(' ', 1)[-1])
+
+
+async def cancel(con, key, params):
+    """asyncpg sends the cancel request itself when a statement times out or its task is cancelled."""
@@ -1,5 +1,11 @@
 import os
-import aiopg
+
+from deebee.connection import Cursor
+
+dialect = 'mysql'
+returning = False
+executemany = True
+paramstyle = 'format'
 
 
 def get_dsn(base_key=''):
@@ -15,7 +21,7 @@ def get_db_params(base_key=''):
         'password': os.getenv(f'{prefix}_PASSWORD'),
         'database': os.getenv(f'{prefix}_NAME'),
         'host': os.getenv(f'{prefix}_HOST'),
-        'port': os.getenv(f'{prefix}_PORT', 5432),
+        'port': os.getenv(f'{prefix}_PORT', 3306),
     }
     return params
 
@@ -39,3 +45,57 @@ def get_connection_params():
         'port': os.getenv('DB_PORT'),
     }
     return conn_params
+
+
+async def get_connection(**params):
+    """Open a connection with autocommit on, by default with DB_* environment params."""
+    import aiomysql
+
+    params = params or get_db_params()
+    params['db'] = params.pop('database', None)
+    params['port'] = int(params['port'])
+    con = await aiomysql.connect(autocommit=True, **params)
+    return con
+
+
+async def cursor(con):
+    return Cursor(await con.cursor())
+
+
+def is_data_error(error: Exception) -> bool:
+    """Return if error was raised by the values of a row, like a constraint violated or an invalid value."""
+    import pymysql
+
+    return isinstance(error, (pymysql.err.IntegrityError, pymysql.err.DataError))
+
+
+async def stream(con, sql, params, batch_size):
+    """Fetch query rows in batches with an unbuffered cursor, which reads rows from socket on demand."""
+    import aiomysql
+
+    cur = Cursor(await con.cursor(aiomysql.SSCursor))
+    try:
+        await cur.execute(sql, params)
+        columns = [col[0] for col in cur.description]
+        while rows := await cur.fetchmany(batch_size):
+            yield columns, rows
+    finally:
+        await cur.close()
+
+
+async def ping(con):
+    await con.ping(reconnect=False)
+
+
+def cancel_key(con):
+    return con.thread_id()
+
+
+async def cancel(con, key, params):
+    """Kill the statement running on connection thread from another connection."""
+    killer = await get_connection(**params)
+    try:
+        async with killer.cursor() as cur:
+            await cur.execute('kill query %s', (key,))
+    finally:
+        killer.close()
@@ -1,5 +1,14 @@
+import itertools
 import os
-import aiopg
+
+from deebee.connection import Cursor as BaseCursor
+
+dialect = 'postgresql'
+returning = True
+executemany = False
+paramstyle = 'format'
+
+_cursor_ids = itertools.count(1)
 
 
 def get_dsn(base_key=''):
@@ -30,12 +39,117 @@ def get_connection_string():
     return connection_string
 
 
-async def get_connection():
+class Cursor(BaseCursor):
+    async def execute(self, sql, params=None, timeout=None):
+        await self.cur.execute(sql, params or None, timeout=timeout)
+
+
+async def get_connection(**params):
+    import aiopg
+
+    if params:
+        return await aiopg.connect(**params)
     dsn = get_connection_string()
     con = await aiopg.connect(dsn)
     return con
 
 
+async def cursor(con):
+    return Cursor(await con.cursor())
+
+
+async def stream(con, sql, params, batch_size):
+    """Fetch query rows in batches through a server side cursor.
+
+    aiopg can not open named cursors, so the cursor is declared inside a transaction and read with fetch
+    commands. When iteration stops early the transaction is rolled back, closing the cursor. Inside a
+    transaction already open the cursor is declared in it and closed at the end. Each cursor has its own
+    name, so streams can be nested on the same connection.
+    """
+    name = f'deebee_stream_{next(_cursor_ids)}'
+    cur = await cursor(con)
+    own = not in_transaction(con)
+    try:
+        if own:
+            await cur.execute('begin')
+        await cur.execute(f'declare {name} no scroll cursor for {sql}', params)
+        columns = None
+        while True:
+            await cur.execute(f'fetch forward {int(batch_size)} from {name}')
+            rows = await cur.fetchall()
+            if not rows:
+                break
+            columns = columns or [col[0] for col in cur.description]
+            yield columns, rows
+        await cur.execute('commit' if own else f'close {name}')
+    except GeneratorExit:
+        await cur.execute('rollback' if own else f'close {name}')
+        raise
+    finally:
+        await cur.close()
+
+
+def in_transaction(con) -> bool:
+    from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+    return con.raw.get_transaction_status() != TRANSACTION_STATUS_IDLE
+
+
+def is_data_error(error: Exception) -> bool:
+    """Return if error was raised by the values of a row, like a constraint violated or an invalid value."""
+    import psycopg2
+
+    return isinstance(error, (psycopg2.IntegrityError, psycopg2.DataError))
+
+
+def cancel_key(con):
+    return con.raw.get_backend_pid()
+
+
+async def cancel(con, key, params):
+    """Cancel the statement running on backend pid from another connection.
+
+    aiopg closes the connection on timeout or cancellation, but the server keeps running the statement
+    until it is canceled.
+    """
+    canceller = await get_connection(**params)
+    try:
+        cur = await cursor(canceller)
+        try:
+            await cur.execute('select pg_cancel_backend(%s)', (key,))
+        finally:
+            await cur.close()
+    finally:
+        await canceller.close()
+
+
+async def prepare(con, name, sql):
+    """Prepare sql on server and return the command that executes it.
+
+    Placeholders %s are numbered as $1, $2... to the prepare command, while the execute
+    command keeps %s placeholders to the values bound by driver.
+    """
+    parts = sql.split('%s')
+    numbered = ''.join(f'{part}${i}' for i, part in enumerate(parts[:-1], 1)) + parts[-1]
+    cur = await cursor(con)
+    try:
+        await cur.execute(f'prepare {name} as {numbered}')
+    finally:
+        await cur.close()
+    if len(parts) == 1:
+        return f'execute {name}'
+    return f"execute {name} ({', '.join(['%s'] * (len(parts) - 1))})"
+
+
+async def deallocate(con, statement):
+    name = statement.split()[1]
+    cur = await cursor(con)
+    try:
+        await cur.execute(f'deallocate {name}')
+    finally:
+        await cur.close()
+
+
 def get_connection_params():
     conn_params = {
         'user': os.getenv('DB_USER'),
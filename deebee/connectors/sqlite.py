@@ -1,5 +1,12 @@
+import asyncio
 import os
-import aiopg
+
+from deebee.connection import Cursor as BaseCursor
+
+dialect = 'sqlite'
+returning = True
+executemany = True
+paramstyle = 'qmark'
 
 
 def get_dsn(base_key=''):
@@ -39,3 +46,58 @@ def get_connection_params():
         'port': os.getenv('DB_PORT'),
     }
     return conn_params
+
+
+class Cursor(BaseCursor):
+    async def execute(self, sql, params=None, timeout=None):
+        await super().execute(sql, params or (), timeout=timeout)
+
+
+async def get_connection(database: str = None, **params):
+    """Open a sqlite database file, by default the one in DB_NAME environment variable.
+
+    Each connection to ':memory:' is a distinct database, so use a file when pool has many connections.
+    Network params from get_db_params are ignored.
+    """
+    import aiosqlite
+
+    for key in ('user', 'password', 'host', 'port'):
+        params.pop(key, None)
+    database = database or os.getenv('DB_NAME', ':memory:')
+    con = await aiosqlite.connect(database, isolation_level=None, **params)
+    return con
+
+
+async def cursor(con):
+    return Cursor(await con.cursor())
+
+
+def is_data_error(error: Exception) -> bool:
+    """Return if error was raised by the values of a row, like a constraint violated."""
+    import sqlite3
+
+    return isinstance(error, (sqlite3.IntegrityError, sqlite3.DataError))
+
+
+async def cancel(con, key, params):
+    """Interrupt the statement running on the connection thread.
+
+    A statement queued to the thread may start after the first interrupt, so interrupts are repeated until a
+    statement queued after it runs, for up to a second. When it is still running, an error is raised and the
+    connection is discarded.
+    """
+    marker = asyncio.ensure_future(con.execute('select 1'))
+    try:
+        for _ in range(1000):
+            await con.interrupt()
+            await asyncio.wait({marker}, timeout=0.001)
+            if marker.done():
+                break
+    finally:
+        if not marker.done():
+            marker.cancel()
+            await asyncio.wait({marker})
+    if marker.cancelled():
+        raise Exception('The statement running on sqlite connection could not be interrupted')
+    if marker.exception() is None:
+        await marker.result().close()
\ No newline at end of file
@@ -1,13 +1,40 @@
 import asyncio
+import base64
+import contextlib
+import contextvars
+import copy
 import datetime
-from typing import Union, Any
+import decimal
+import functools
+import itertools
+import json
+import re
+import time
+import uuid
+from typing import Union, Any, AsyncIterable, AsyncIterator, Iterable
 
+from deebee.batch import Batch
+from deebee.cache import LRUCache, ResultCache
+from deebee.errors import QueryTimeout
+from deebee.fanout import fan_out
+from deebee.loader import Loader
+from deebee.metrics import UNTIMED, QueryEvent, emit
 from deebee.pool import Pool
+from deebee.rows import make_decoder, make_row, make_rows
+from deebee.schema import TableSchema, introspect
+from deebee.writer import Writer
 
 
 __all__ = ['DB']
 
+MAX_PARAMS = 32766
+COPY_UPDATE_ROWS = 10000
 
+# Deadline until reads of the task go to primary, by id of the primary pool written by the task.
+primary_until: contextvars.ContextVar[dict] = contextvars.ContextVar('deebee_primary_until', default={})
+
+
+@functools.lru_cache(maxsize=1024)
 def identify_operator(
         key: str
 ) -> tuple[str, str, str]:
@@ -44,11 +71,249 @@ def identify_operator(
             op = 'like'
         elif code in ['ends', 'ed']:
             op = 'like'
-        elif code == ['contains', 'ct']:
+        elif code in ['contains', 'ct']:
             op = 'like'
     return name, op, code
 
 
+def make_values(
+        value: any,
+        code: str = ''
+) -> list:
+    """Return the values bound to statement by key __ suffix.
+
+    :param value:
+    :param code:
+    :return:
+    """
+    if code in ('starts', 'st'):
+        return [f'{value}%']
+    if code in ('ends', 'ed'):
+        return [f'%{value}']
+    if code in ('contains', 'ct'):
+        return [f'%{value}%']
+    if code in ('between', 'bw'):
+        return [value[0], value[1]]
+    if code in ('in', 'nin'):
+        return list(value)
+    if isinstance(value, str) and value.startswith('ST_'):
+        return []
+    return [value]
+
+
+def where_shape(
+        where: dict
+) -> tuple[tuple, list]:
+    """Return the shape of where section and the values bound to it.
+
+    The shape identifies the sql generated to the where section, so it keys the compiled sql cache.
+
+    :param where:
+    :return:
+    """
+    shape = []
+    values = []
+    for key, value in where.items():
+        code = identify_operator(key)[2]
+        bound = make_values(value, code)
+        if bound or code in ('in', 'nin'):
+            shape.append((key, len(bound)))
+            values.extend(bound)
+        else:
+            shape.append((key, value))
+    return tuple(shape), values
+
+
+def data_shape(
+        data: dict
+) -> tuple[tuple, list]:
+    """Return the shape of a row written by insert or update and the values bound to it.
+
+    :param data:
+    :return:
+    """
+    shape = []
+    values = []
+    for key, value in data.items():
+        if isinstance(value, str) and value.startswith('ST_'):
+            shape.append((key, value))
+        else:
+            shape.append(key)
+            values.append(value)
+    return tuple(shape), values
+
+
+def order_shape(
+        order: Union[str, dict, list, tuple]
+) -> Union[str, tuple]:
+    return order if isinstance(order, str) else tuple(order)
+
+
+def make_order_keys(
+        order: Union[str, dict, list, tuple]
+) -> list[tuple[str, bool]]:
+    """Return each order column name and if it is descending.
+
+    :param order:
+    :return:
+    """
+    cols = order.split(',') if isinstance(order, str) else order
+    keys = []
+    for col in cols:
+        spt = col.split()
+        if spt:
+            keys.append((spt[0], len(spt) > 1 and spt[1].lower() == 'desc'))
+    return keys
+
+
+def make_seek_pairs(
+        keys: list[tuple[str, bool]],
+        last: list
+) -> tuple[tuple, list]:
+    """Return the where pairs that seek rows after the last ones by order keys.
+
+    The first pair bounds the leading order column, so an index on order columns can be used, and the
+    next ones are the or terms comparing each column after the previous ones are equal.
+
+    :param keys:
+    :param last:
+    :return:
+    """
+    bound = None
+    if len(keys) > 1:
+        name, desc = keys[0]
+        bound = (f"{name}__{'lte' if desc else 'gte'}", last[0])
+    terms = []
+    for i, (name, desc) in enumerate(keys):
+        term = [(f'{col}__eq', value) for (col, _), value in zip(keys[:i], last[:i])]
+        term.append((f"{name}__{'lt' if desc else 'gt'}", last[i]))
+        terms.append(term)
+    return bound, terms
+
+
+def _encode_json_value(value):
+    """Return value not serializable to json as text read back by PostgreSQL input of its column type.
+
+    Bytes become the hex format of bytea, as their str would be stored as the b'...' text.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return '\\x' + bytes(value).hex()
+    return str(value)
+
+
+def _encode_cursor_value(value):
+    if isinstance(value, datetime.datetime):
+        return {'$t': 'datetime', 'v': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$t': 'date', 'v': value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {'$t': 'time', 'v': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'$t': 'decimal', 'v': str(value)}
+    if isinstance(value, uuid.UUID):
+        return {'$t': 'uuid', 'v': str(value)}
+    raise TypeError(f'Type {type(value).__name__} can not be used in keyset cursor')
+
+
+_cursor_types = {
+    'datetime': datetime.datetime.fromisoformat,
+    'date': datetime.date.fromisoformat,
+    'time': datetime.time.fromisoformat,
+    'decimal': decimal.Decimal,
+    'uuid': uuid.UUID,
+}
+
+
+def encode_cursor(
+        values: list
+) -> str:
+    """Return an opaque cursor with the order key values of the last row.
+
+    :param values:
+    :return:
+    """
+    text = json.dumps(values, default=_encode_cursor_value, separators=(',', ':'))
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def decode_cursor(
+        cursor: str
+) -> list:
+    """Return the order key values from a cursor created by encode_cursor.
+
+    :param cursor:
+    :return:
+    """
+    try:
+        text = base64.urlsafe_b64decode(cursor.encode()).decode()
+        return json.loads(text, object_hook=lambda o: _cursor_types[o['$t']](o['v']) if '$t' in o else o)
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+
+
+class Params:
+    def __init__(self, style: str = 'format'):
+        """Collect values bound to a statement and write its placeholders.
+
+        :param style: 'format' for %s, 'numeric' for $1 and 'qmark' for ? placeholders.
+        """
+        self.style = style
+        self.values = []
+
+    def bind(self, value: any) -> str:
+        self.values.append(value)
+        if self.style == 'numeric':
+            return f'${len(self.values)}'
+        if self.style == 'qmark':
+            return '?'
+        return '%s'
+
+
+async def make_chunks(
+        rows: Union[Iterable, AsyncIterable],
+        size: int
+) -> AsyncIterator[list]:
+    """Yield lists with up to size items taken lazily from an iterable or async iterable.
+
+    :param rows:
+    :param size:
+    :return:
+    """
+    chunk = []
+    if hasattr(rows, '__aiter__'):
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    else:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def make_key_columns(
+        key: Union[str, tuple, list]
+) -> list[str]:
+    if isinstance(key, str):
+        return [k.strip() for k in key.split(',') if k.strip()]
+    return list(key or [])
+
+
+def make_key_where(
+        keys_cols: list,
+        pk: any
+) -> dict:
+    """Return the where conditions to a row by its key value, or by a tuple of values to composite keys."""
+    if len(keys_cols) > 1:
+        return dict(zip(keys_cols, pk))
+    return {keys_cols[0]: pk}
+
+
 def make_column_alias(column):
     spt = column.split(':')
     if len(spt) > 1:
@@ -63,12 +328,303 @@ def make_columns_section(columns):
     return ret
 
 
+def invalidates(method):
+    """Invalidate cached results of the table written by a DB method, even when it fails."""
+    @functools.wraps(method)
+    async def wrapper(self, table, *args, **kwargs):
+        try:
+            return await method(self, table, *args, **kwargs)
+        finally:
+            self.invalidate(table)
+    return wrapper
+
+
 class DB:
-    def __init__(self, pool=None):
-        self.pool = pool or Pool()
+    def __init__(
+            self,
+            pool=None,
+            *,
+            backend: str = None,
+            shape_cache_size: int = 512,
+            cache: ResultCache = None,
+            loader_window: float = None,
+            replicas: list = None,
+            read_your_writes: float = 0,
+            timeout: float = None,
+            typed: bool = False
+    ):
+        """Database helper.
+
+        Given replicas, reads made by select, row, value, stream and helpers built on them are sent to the replica
+        with fewer requests outstanding, while writes, execute, transactions and pinned connections use the
+        primary pool.
+
+            db = DB(Pool('postgresql', base_key='primary'), replicas=['replica1', 'replica2'], read_your_writes=2)
+
+        :param pool: connections pool, a default one is created when not given. Pools created by DB, this one and
+            replicas given by base keys, are terminated when DB is collected, pools given are left open.
+        :param backend: backend name of the default pool, see deebee.backends.
+        :param shape_cache_size: number of sql shapes compiled by helpers kept in cache.
+        :param cache: results cache used by get_list, get_item and count, invalidated by writes of this DB.
+        :param loader_window: when set, get_item lookups by key made within this seconds, or in the same
+            loop iteration when zero, are merged in a single query. None disables it.
+        :param replicas: read only pools, or base keys whose DB_<KEY>_* environment params build them.
+        :param read_your_writes: seconds reads of a task stay in primary after it writes, so it reads what it wrote
+            even when replicas lag.
+        :param timeout: default seconds a statement may run, and its prepare when prepared. On timeout the
+            statement is canceled on server, QueryTimeout is raised and the connection is reset or discarded.
+            Streams are not limited, since their rows are fetched while the caller consumes them.
+        :param typed: convert values written and read by helpers with the encoders and decoders of the table
+            columns, see schema.
+        """
+        self.pool = pool or Pool(backend)
+        self.replicas: list[Pool] = [
+            Pool(self.pool.backend, base_key=replica) if isinstance(replica, str) else replica
+            for replica in replicas or ()
+        ]
+        self.__owned: list[Pool] = [] if pool is not None else [self.pool]
+        self.__owned += [r for r, replica in zip(self.replicas, replicas or ()) if isinstance(replica, str)]
+        self.read_your_writes = read_your_writes
+        self.timeout = timeout
+        self.shapes = LRUCache(shape_cache_size)
+        self.cache = cache
+        self.loader = Loader(self, window=loader_window) if loader_window is not None else None
+        self.hooks: list = []
+        self.typed = typed
+        self.schemas: dict[str, TableSchema] = {}
+        self.__connection = None
+        self.__released = False
+        self.__depth = 0
+        self.__written = None
+        self.__rotation = itertools.count()
 
     def __del__(self):
-        self.pool.close()
+        for pool in getattr(self, '_DB__owned', ()):
+            pool.terminate()
+
+    @property
+    def pinned(self) -> bool:
+        """If this DB runs all statements on a single connection, given by connection or transaction."""
+        return self.__connection is not None
+
+    def batch(self) -> Batch:
+        """Return a batch context whose methods return futures, resolved running the statements together on exit.
+
+            async with db.batch() as b:
+                count = b.count('orders', where={'status': 'open'})
+                last = b.row('select * from orders order by id desc')
+
+        :return:
+        """
+        return Batch(self)
+
+    def writer(
+            self,
+            table: str,
+            *,
+            max_batch: int = 1000,
+            max_delay: float = 0.05,
+            max_pending: int = None,
+            on_error: callable = None
+    ) -> Writer:
+        """Return a buffered writer inserting rows to table in batches, in background.
+
+        Use it instead of insert by row for high rate inserts, when the inserted rows are not needed back.
+        Close it, or use it as async context, to insert the rows left in buffer.
+
+            async with db.writer('events', max_batch=5000, max_delay=0.1) as w:
+                async for event in events:
+                    await w.write(event)
+
+        :param table:
+        :param max_batch: rows inserted by statement.
+        :param max_delay: seconds a row waits in buffer before the batch is inserted.
+        :param max_pending: rows buffered or being inserted before write waits for room.
+        :param on_error: function called with the row and error of each row failed.
+        :return:
+        """
+        return Writer(self, table, max_batch, max_delay, max_pending, on_error)
+
+    async def map(
+            self,
+            fn_or_sql: Union[str, callable],
+            items: Union[Iterable, AsyncIterable],
+            *,
+            concurrency: int = None,
+            ordered: bool = True,
+            return_exceptions: bool = False
+    ) -> AsyncIterator:
+        """Run a query or coroutine function to each item with bounded concurrency, yielding the results.
+
+        With sql, each item is the params of a select and its rows are yielded. With a function, it is called
+        with each item. At most concurrency calls run at same time, so no more than that many pool connections
+        are used, and items are taken lazily as results are consumed.
+
+            async for rows in db.map('select * from orders where shard = %s', [[s] for s in shards], concurrency=4):
+                ...
+
+        :param fn_or_sql: select sql or coroutine function receiving an item.
+        :param items: iterable or async iterable of items.
+        :param concurrency: maximum calls running at same time, by default pool max_size.
+        :param ordered: yield results in items order, otherwise as they complete.
+        :param return_exceptions: yield the error of a failed item in place of its result instead of raising it.
+        :return:
+        """
+        if isinstance(fn_or_sql, str):
+            sql = fn_or_sql
+
+            def fn(params):
+                return self.select(sql, params=params)
+        else:
+            fn = fn_or_sql
+        if self.__connection is not None:
+            concurrency = 1
+        results = fan_out(fn, items, concurrency or self.pool.max_size, ordered, return_exceptions)
+        async with contextlib.aclosing(results) as results:
+            async for result in results:
+                yield result
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        """Pin one pooled connection to run all methods called through the DB given by context.
+
+        Inside an already pinned context the same DB is given. Statements on a pinned connection run one at
+        a time, so the given DB must not be shared by concurrent tasks. The given DB can not be used after the
+        context ends, since its connection is back in the pool.
+
+            async with db.connection() as c:
+                item = await c.get_item('users', key='id', pk=1)
+
+        :return:
+        """
+        if self.__connection is not None:
+            yield self
+            return
+        self.__check_released()
+        pinned = copy.copy(self)
+        pinned.loader = None
+        pinned.__owned = []
+        pinned.__connection = await self.pool.acquire()
+        try:
+            yield pinned
+        finally:
+            con, pinned.__connection = pinned.__connection, None
+            pinned.__released = True
+            await self.pool.release(con)
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Run all methods called through the DB given by context in one transaction.
+
+        The transaction is committed when the context ends and rolled back when it raises. Nested
+        transactions use savepoints. Results cache is not read inside transactions and tables written
+        are invalidated again on commit.
+
+            async with db.transaction() as tx:
+                await tx.insert('orders', data=order)
+                await tx.update('stock', key='id', pk=item['id'], data=item)
+
+        :return:
+        """
+        async with self.connection() as db:
+            con = db.__connection
+            savepoint = f'deebee_{db.__depth}' if db.__depth else ''
+            await con.execute(f'savepoint {savepoint}' if savepoint else 'begin')
+            if not savepoint:
+                db.__written = set()
+            db.__depth += 1
+            try:
+                yield db
+            except BaseException:
+                db.__depth -= 1
+                try:
+                    await con.execute(f'rollback to savepoint {savepoint}' if savepoint else 'rollback')
+                except Exception:
+                    await con.close()
+                raise
+            else:
+                db.__depth -= 1
+                await con.execute(f'release savepoint {savepoint}' if savepoint else 'commit')
+            finally:
+                if not savepoint:
+                    written, db.__written = db.__written, None
+                    for table in written:
+                        db.invalidate(table)
+
+    def add_hook(self, hook):
+        """Add a function called with a QueryEvent after each statement.
+
+        Hooks receive the statement, its time by phase, rows returned and error raised. Statements are not
+        timed while there are no hooks.
+
+            metrics = MetricsRegistry()
+            db.add_hook(metrics)
+            db.add_hook(SlowQueryLog(threshold=0.5))
+
+        :param hook:
+        :return:
+        """
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def invalidate(self, table: str):
+        """Drop cached results read from table.
+
+        Writes made by DB helpers call it, use it after writing to table with execute.
+
+        :param table:
+        :return:
+        """
+        self.__wrote()
+        if self.cache is None:
+            return
+        self.cache.invalidate(table)
+        if self.__written is not None:
+            self.__written.add(table)
+
+    async def schema(
+            self,
+            table: str,
+            refresh: bool = False
+    ) -> TableSchema:
+        """Return the columns and keys of table, read from database catalog on first use and kept in cache.
+
+        The schema gives the key used by get_item, update, apply and delete when key is omitted, and the
+        column encoders and decoders used by helpers when DB is typed.
+
+        :param table:
+        :param refresh: read the schema again, after table was altered.
+        :return:
+        """
+        schema = self.schemas.get(table)
+        if schema is None or refresh:
+            con = await self.__acquire()
+            try:
+                schema = await introspect(con, self.pool.connector.dialect, self.__params, table)
+            finally:
+                await self.__release(con)
+            self.schemas[table] = schema
+        return schema
+
+    def refresh_schema(self, table: str = None):
+        """Drop cached schema of table, or of all tables, read again on next use.
+
+        :param table:
+        :return:
+        """
+        if table is None:
+            self.schemas.clear()
+        else:
+            self.schemas.pop(table, None)
+
+    async def close(self):
+        """Close all pool connections waiting the ones in use to be released.
+
+        :return:
+        """
+        await asyncio.gather(self.pool.close(), *(replica.close() for replica in self.replicas))
 
     async def select(
             self,
@@ -76,8 +632,11 @@ class DB:
             *,
             params: Union[list, tuple] = None,
             model: any = None,
-            timeout: int = None
-    ) -> Union[list, tuple]:
+            timeout: int = None,
+            prepare: bool = False,
+            row_format: str = 'dict',
+            decoders: dict = None
+    ) -> Union[list, tuple, dict]:
         """Returns data list by query
 
         Execute a current select query passed by sql param. Each item by list is a dict
@@ -88,11 +647,18 @@ class DB:
         :param params:
         :param model:
         :param timeout:
+        :param prepare: run as a server side prepared statement cached by connection.
+        :param row_format: 'dict', 'tuple', 'record' (named tuple class cached by columns), 'columnar'
+            (dict of column lists), 'numpy' (dict of column arrays) or 'arrow' (pyarrow RecordBatch).
+        :param decoders: function converting values by column name, like TableSchema decoders.
         :return:
         """
         if not params:
             params = []
-        data = await self.__query(sql, params=params, model=model, timeout=timeout)
+        data = await self.__query(
+            sql, params=params, model=model, timeout=timeout, prepare=prepare, row_format=row_format, read=True,
+            decoders=decoders
+        )
         return data or (None if model else [])
 
     async def row(
@@ -102,7 +668,10 @@ class DB:
             params: Union[list, tuple] = None,
             model: any = None,
             last: bool = False,
-            timeout=None
+            timeout=None,
+            prepare: bool = False,
+            row_format: str = 'dict',
+            decoders: dict = None
     ) -> Union[dict, any]:
         """Returns the data as dict
 
@@ -115,11 +684,17 @@ class DB:
         :param model:
         :param last:
         :param timeout:
+        :param prepare:
+        :param row_format: 'dict', 'tuple' or 'record'.
+        :param decoders: function converting values by column name, like TableSchema decoders.
         :return:
         """
         if not params:
             params = ()
-        data = await self.__query(sql, params=params, one=True, model=model, last=last, timeout=timeout)
+        data = await self.__query(
+            sql, params=params, one=True, model=model, last=last, timeout=timeout, prepare=prepare,
+            row_format=row_format, read=True, decoders=decoders
+        )
         return data or {}
 
     async def value(
@@ -127,7 +702,8 @@ class DB:
             sql: str,
             *,
             params: Union[list, tuple] = None,
-            timeout: int = None
+            timeout: int = None,
+            prepare: bool = False
     ) -> any:
         """Returns only one value.
 
@@ -136,9 +712,10 @@ class DB:
         :param sql:
         :param params:
         :param timeout:
+        :param prepare:
         :return:
         """
-        v = await self.__query(sql, params=params, one=True, value=True, timeout=timeout)
+        v = await self.__query(sql, params=params, one=True, value=True, timeout=timeout, prepare=prepare, read=True)
         return v
 
     async def execute(
@@ -146,20 +723,162 @@ class DB:
             sql: str,
             *,
             params=None,
-            timeout=None
+            timeout=None,
+            prepare: bool = False
     ) -> any:
         """Execute a sql command.
 
         :param sql:
         :param params:
         :param timeout:
+        :param prepare:
         :return:
         """
         if not params:
             params = []
-        ret = await self.__query(sql, params=params, select=False, timeout=timeout)
+        self.__wrote()
+        ret = await self.__query(sql, params=params, select=False, timeout=timeout, prepare=prepare)
         return ret
 
+    async def stream(
+            self,
+            sql: str,
+            *,
+            params: Union[list, tuple] = None,
+            model: any = None,
+            batch_size: int = 1000,
+            row_format: str = 'dict'
+    ) -> AsyncIterator[Union[dict, any]]:
+        """Iterate over rows returned by query without loading all of them.
+
+        Rows are fetched from server in batches of batch_size, using server side cursors when the backend
+        supports them, so memory is bounded by the batch size. The connection stays checked out until
+        the iteration ends. Use contextlib.aclosing to release it right away when leaving the loop early.
+        DB timeout does not apply, cancel the iterating task to stop the query, which discards the connection.
+
+        :param sql:
+        :param params:
+        :param model:
+        :param batch_size:
+        :param row_format: 'dict', 'tuple' or 'record'.
+        :return:
+        """
+        if row_format in ('columnar', 'numpy', 'arrow'):
+            raise ValueError('Columnar formats can only be used by iterate, which yields batches')
+        batches = self.iterate(sql, params=params, model=model, batch_size=batch_size, row_format=row_format)
+        async with contextlib.aclosing(batches):
+            async for rows in batches:
+                for row in rows:
+                    yield row
+
+    async def iterate(
+            self,
+            sql: str,
+            *,
+            params: Union[list, tuple] = None,
+            model: any = None,
+            batch_size: int = 1000,
+            row_format: str = 'dict'
+    ) -> AsyncIterator[Union[list, dict]]:
+        """Iterate over batches of rows returned by query.
+
+        Same as stream, but each item is a list with up to batch_size rows, or a dict of columns to
+        columnar formats.
+
+        :param sql:
+        :param params:
+        :param model:
+        :param batch_size:
+        :param row_format: same formats of select.
+        :return:
+        """
+        con = await self.__acquire(read=True)
+        try:
+            async with contextlib.aclosing(con.stream(sql, params or [], batch_size)) as batches:
+                async for columns, rows in batches:
+                    yield make_rows(columns, rows, row_format, model)
+        except GeneratorExit:
+            raise
+        except BaseException:
+            if con is not self.__connection:
+                await con.close()
+            raise
+        finally:
+            await self.__release(con)
+
+    async def select_arrow(
+            self,
+            sql: str,
+            *,
+            params: Union[list, tuple] = None,
+            batch_size: int = 10000,
+            schema: any = None,
+            output: str = 'arrow'
+    ) -> any:
+        """Return query rows as a pyarrow Table built straight from the fetched batches.
+
+        Rows are fetched in batches as iterate does and each batch becomes an Arrow record batch column by column,
+        without a dict by row. The table holds the record batches as chunks, joined without copying.
+        Requires pyarrow.
+
+        :param sql:
+        :param params:
+        :param batch_size: rows fetched and converted at a time.
+        :param schema: pyarrow schema of the result, by default types are inferred from values.
+        :param output: 'arrow' for the pyarrow Table, 'pandas' or 'polars' for a DataFrame of those libraries
+            backed by the Arrow buffers, without copying them.
+        :return:
+        """
+        import pyarrow
+
+        if output not in ('arrow', 'pandas', 'polars'):
+            raise ValueError(f'Unknown output {output}, use arrow, pandas or polars')
+        tables = []
+        batches = self.iterate(sql, params=params, batch_size=batch_size, row_format='arrow')
+        async with contextlib.aclosing(batches):
+            async for batch in batches:
+                tables.append(pyarrow.Table.from_batches([batch if schema is None else batch.cast(schema)]))
+        if tables:
+            table = pyarrow.concat_tables(tables, promote_options='permissive')
+        else:
+            table = schema.empty_table() if schema is not None else pyarrow.table({})
+        if output == 'pandas':
+            import pandas
+
+            return table.to_pandas(types_mapper=pandas.ArrowDtype)
+        if output == 'polars':
+            import polars
+
+            return polars.from_arrow(table, rechunk=False)
+        return table
+
+    async def select_numpy(
+            self,
+            sql: str,
+            *,
+            params: Union[list, tuple] = None,
+            batch_size: int = 10000
+    ) -> dict:
+        """Return query rows as a dict with a numpy array by column.
+
+        Each fetched batch becomes one array by column, without a dict by row, and the arrays of each column are
+        concatenated at the end. Requires numpy.
+
+        :param sql:
+        :param params:
+        :param batch_size: rows fetched and converted at a time.
+        :return:
+        """
+        import numpy
+
+        chunks = {}
+        batches = self.iterate(sql, params=params, batch_size=batch_size, row_format='numpy')
+        async with contextlib.aclosing(batches):
+            async for batch in batches:
+                for column, values in batch.items():
+                    chunks.setdefault(column, []).append(values)
+        return {column: numpy.concatenate(values) for column, values in chunks.items()}
+
     async def get_list(
             self,
             table: str,
@@ -169,8 +888,11 @@ class DB:
             order: Union[list[str], tuple[str], str] = None,
             page: int = 1,
             size: int = 20,
-            model: any = None
-    ) -> Union[list, tuple]:
+            model: any = None,
+            after: str = None,
+            row_format: str = 'dict',
+            cache_ttl: float = None
+    ) -> Union[list, tuple, dict]:
         """Creates a query and return a list.
 
         This is a helper method that takes the table name, columns list and a constraint dict and generate
@@ -178,6 +900,11 @@ class DB:
 
         The return is the value returned by select method.
 
+        When after is given, keyset pagination is used instead of page offset: rows following the cursor by
+        order columns are returned with the cursor to next page, as a (rows, cursor) tuple. Pass an empty
+        string to get the first page. The next cursor is None when there are no more rows. Order columns
+        must be selected, not null and identify a row uniquely, like ending with the primary key.
+
         :param size:
         :param page:
         :param table:
@@ -185,6 +912,9 @@ class DB:
         :param where:
         :param order:
         :param model:
+        :param after: cursor returned by previous page.
+        :param row_format: same formats of select, keyset pagination accepts only 'dict' and 'record'.
+        :param cache_ttl: seconds to keep the result in DB cache, by default the cache ttl. Zero skips cache.
         :return:
         """
         if not where:
@@ -193,13 +923,84 @@ class DB:
             order = ()
         if not columns:
             columns = ()
-        sql = self.__generate_query_sql(table, columns=columns, where=where, order=order)
+        if after is not None:
+            return await self.__get_page(table, columns, where, order, size, after, model, row_format, cache_ttl)
+        schema = await self.__typed(table)
+        decoders = None
+        if schema:
+            where, decoders = schema.encode_where(where), schema.decoders
+        where_key, values = where_shape(where)
+        shape = ('list', table, order_shape(columns), where_key, order_shape(order), bool(page))
+
+        def generate(params):
+            sql = self.__generate_query_sql(table, params, columns=columns, where=where, order=order)
+            if page:
+                sql = f'{sql} limit {params.bind(size)} offset {params.bind(0)}'
+            return sql
+
+        sql = self.__compiled(shape, generate)
         if page:
-            offset = (page - 1) * size
-            sql = f'{sql} limit {size} offset {offset}'
-        data = await self.select(sql, model=model)
+            values += [size, (page - 1) * size]
+        data = await self.__cached(
+            table, ('select', sql, tuple(values), model, row_format), cache_ttl,
+            lambda: self.select(sql, params=values, model=model, prepare=True, row_format=row_format, decoders=decoders)
+        )
         return data
 
+    async def __get_page(
+            self,
+            table: str,
+            columns: Union[list[str], tuple[str], str],
+            where: dict,
+            order: Union[list[str], tuple[str], str],
+            size: int,
+            after: str,
+            model: any = None,
+            row_format: str = 'dict',
+            cache_ttl: float = None
+    ) -> tuple[list, str]:
+        """Return rows after the cursor by keyset pagination and the next cursor."""
+        if row_format not in ('dict', 'record'):
+            raise ValueError('Keyset pagination only accepts dict and record row formats')
+        keys = make_order_keys(order)
+        if not keys:
+            raise Exception('Order columns must be informed to keyset pagination')
+        last = decode_cursor(after) if after else []
+        if last and len(last) != len(keys):
+            raise ValueError('Cursor does not match order columns')
+        schema = await self.__typed(table)
+        decoders = None
+        if schema:
+            where, decoders = schema.encode_where(where), schema.decoders
+        where_key, values = where_shape(where)
+        bound, terms = make_seek_pairs(keys, last) if last else (None, [])
+        shape = ('page', table, order_shape(columns), where_key, order_shape(order), bool(last))
+
+        def generate(params):
+            columns_sql = make_columns_section(columns)
+            where_sql = self.__generate_where_section(params, where)
+            if last:
+                seek_sql = self.__generate_seek_section(params, bound, terms)
+                where_sql = f'{where_sql} and {seek_sql}' if where_sql else f'where {seek_sql}'
+            order_sql = self.__generate_order_section(order)
+            return f"""select {columns_sql} from {table} {where_sql} {order_sql} limit {params.bind(size)}"""
+
+        sql = self.__compiled(shape, generate)
+        if bound:
+            values.append(bound[1])
+        values.extend(value for term in terms for _, value in term)
+        values.append(size)
+        rows = await self.__cached(
+            table, ('select', sql, tuple(values), model, row_format), cache_ttl,
+            lambda: self.select(sql, params=values, model=model, prepare=True, row_format=row_format, decoders=decoders)
+        ) or []
+        cursor = None
+        if len(rows) == size:
+            row = rows[-1]
+            get = row.get if isinstance(row, dict) else functools.partial(getattr, row)
+            cursor = encode_cursor([get(name.split('.')[-1]) for name, _ in keys])
+        return rows, cursor
+
     async def array(
             self,
             table: str,
@@ -226,47 +1027,80 @@ class DB:
             self,
             table: str,
             *,
-            pk: Union[str, int, float] = '',
+            pk: Union[str, int, float, tuple] = '',
             key: str = '',
             where: dict = None,
             model: any = None,
-            order: Union[dict, list[str], tuple[str], str] = ''
+            order: Union[dict, list[str], tuple[str], str] = '',
+            cache_ttl: float = None
     ) -> Union[dict, any]:
         """Return the item by query generated by arguments
 
         :param table:
-        :param pk:
-        :param key:
+        :param pk: key value, or tuple of values to composite keys.
+        :param key: key column, by default the primary key or first unique constraint of table schema.
         :param where:
         :param model:
         :param order:
+        :param cache_ttl: seconds to keep the result in DB cache, by default the cache ttl. Zero skips cache.
         :return:
         """
+        if pk and not key and not where:
+            keys_cols = await self.__key_columns(table, key)
+            if len(keys_cols) > 1:
+                where = make_key_where(keys_cols, pk)
+            else:
+                key = keys_cols[0]
+        if self.loader and pk and key and not where and not order:
+            return await self.loader.load(table, key, pk, model)
         if not where:
             where = {key: pk} if pk else {}
-        sql = self.__generate_query_sql(table, where=where, order=order)
-        item = await self.row(sql, model=model)
+        schema = await self.__typed(table)
+        decoders = None
+        if schema:
+            where, decoders = schema.encode_where(where), schema.decoders
+        where_key, values = where_shape(where)
+        shape = ('item', table, where_key, order_shape(order))
+        sql = self.__compiled(shape, lambda params: self.__generate_query_sql(table, params, where=where, order=order))
+        item = await self.__cached(
+            table, ('row', sql, tuple(values), model), cache_ttl,
+            lambda: self.row(sql, params=values, model=model, prepare=True, decoders=decoders)
+        )
         return item
 
     async def count(
             self,
             table: str,
             *,
-            where: dict = None
+            where: dict = None,
+            cache_ttl: float = None
     ) -> any:
         """Return the number of rows affected.
 
         :param table:
         :param where:
+        :param cache_ttl: seconds to keep the result in DB cache, by default the cache ttl. Zero skips cache.
         :return:
         """
         if not where:
             where = {}
-        where_section = self.__generate_where_section(where=where)
-        sql = f"""select count(*) as count from {table} {where_section}"""
-        c = await self.value(sql)
+        schema = await self.__typed(table)
+        if schema:
+            where = schema.encode_where(where)
+        where_key, values = where_shape(where)
+
+        def generate(params):
+            where_section = self.__generate_where_section(params, where=where)
+            return f"""select count(*) as count from {table} {where_section}"""
+
+        sql = self.__compiled(('count', table, where_key), generate)
+        c = await self.__cached(
+            table, ('value', sql, tuple(values)), cache_ttl,
+            lambda: self.value(sql, params=values, prepare=True)
+        )
         return 0 if c is None else c
 
+    @invalidates
     async def insert(
             self,
             table: str,
@@ -276,10 +1110,245 @@ class DB:
     ) -> Union[dict, any]:
         if not isinstance(data, (dict, list)):
             data = data.dict()
-        sql = self.__generate_insert_command(table, data)
-        data = await self.__query(sql, one=True, model=model)
+        schema = await self.__typed(table)
+        decoders = None
+        if schema:
+            data = schema.encode(data) if isinstance(data, dict) else [schema.encode(item) for item in data]
+            decoders = schema.decoders
+        if not self.pool.connector.returning:
+            return await self.__insert_read(table, [data] if isinstance(data, dict) else data, model, decoders)
+        if isinstance(data, dict):
+            data_key, values = data_shape(data)
+            sql = self.__compiled(('insert', table, data_key), lambda p: self.__generate_insert_command(table, data, p))
+            data = await self.__query(sql, params=values, one=True, model=model, prepare=True, decoders=decoders)
+            return data
+        params = self.__params()
+        sql = self.__generate_insert_command(table, data, params)
+        data = await self.__query(sql, params=params.values, one=True, model=model, decoders=decoders)
         return data
 
+    @invalidates
+    async def bulk_insert(
+            self,
+            table: str,
+            rows: Union[Iterable, AsyncIterable],
+            *,
+            chunk_size: int = 1000,
+            returning: bool = False,
+            model: any = None
+    ) -> Union[int, list]:
+        """Insert many rows in chunks, keeping memory bounded by chunk size.
+
+        Rows are taken lazily from an iterable or async iterable of dicts and written on a single connection
+        inside a transaction. Connectors with a bulk load protocol copy each chunk, the ones supporting
+        executemany run the insert per chunk and the others send a multi row insert per chunk.
+
+        Returns the number of rows inserted, or the inserted rows when returning is set.
+
+        :param table:
+        :param rows:
+        :param chunk_size:
+        :param returning: return inserted rows, which requires a multi row insert per chunk.
+        :param model:
+        :return:
+        """
+        connector = self.pool.connector
+        if returning and not connector.returning:
+            raise Exception('Backend does not support returning inserted rows')
+        inserted = [] if returning else 0
+        columns = None
+        schema = await self.__typed(table)
+        decoders = schema.decoders if schema else None
+        async with self.transaction() as db:
+            con = db.__connection
+            async for chunk in make_chunks(rows, chunk_size):
+                chunk = [row if isinstance(row, dict) else row.dict() for row in chunk]
+                if schema:
+                    chunk = [schema.encode(row) for row in chunk]
+                if columns is None:
+                    columns = list(chunk[0].keys())
+                records = [tuple(row[c] for c in columns) for row in chunk]
+                if returning:
+                    rows_inserted = await self.__insert_rows(
+                        con, table, columns, records, returning=True, model=model, decoders=decoders
+                    )
+                    inserted.extend(rows_inserted)
+                elif hasattr(connector, 'copy'):
+                    inserted += await self.__statement(
+                        con, f'copy {table}', lambda event: con.copy(table, columns, records)
+                    )
+                elif connector.executemany:
+                    params = self.__params()
+                    values = ', '.join(params.bind(None) for _ in columns)
+                    sql = f"insert into {table}({', '.join(columns)}) values ({values})"
+                    inserted += await self.__execute(con, sql, records, many=True)
+                else:
+                    await self.__insert_rows(con, table, columns, records)
+                    inserted += len(records)
+        return inserted
+
+    async def __insert_read(
+            self,
+            table: str,
+            data: list,
+            model: any = None,
+            decoders: dict = None
+    ) -> Union[dict, any]:
+        """Insert data and read the first row back by key, to backends without returning.
+
+        When data has no value to the key, it was generated by an auto increment column read by last_insert_id.
+        """
+        keys_cols = await self.__key_columns(table, '')
+        item = data[0]
+        async with self.connection() as db:
+            con = db.__connection
+            params = self.__params()
+            await self.__execute(con, self.__generate_insert_command(table, data, params, output=''), params.values)
+            if all(k in item for k in keys_cols):
+                rows = await self.__fetch_keys(con, table, keys_cols, [item], model, decoders)
+            elif len(keys_cols) == 1:
+                sql = f'select * from {table} where {keys_cols[0]} = last_insert_id()'
+                rows = await self.__fetch(con, sql, [], model, decoders)
+            else:
+                raise Exception(f'The key columns of the row inserted in {table} must be informed!')
+        return rows[0] if rows else None
+
+    async def __insert_rows(
+            self,
+            con,
+            table: str,
+            columns: list,
+            records: list,
+            returning: bool = False,
+            model: any = None,
+            decoders: dict = None
+    ) -> list:
+        """Insert records with multi row inserts sized under the bound params limit of backends."""
+        step = max(1, MAX_PARAMS // len(columns))
+        output = '*' if returning else ''
+        rows = []
+        for start in range(0, len(records), step):
+            params = self.__params()
+            data = [dict(zip(columns, record)) for record in records[start:start + step]]
+            sql = self.__generate_insert_command(table, data, params, output=output)
+            if output:
+                rows.extend(await self.__fetch(con, sql, params.values, model, decoders))
+            else:
+                await self.__execute(con, sql, params.values)
+        return rows
+
+    async def __update_rows(
+            self,
+            con,
+            table: str,
+            keys_cols: list,
+            items: list,
+            returning: bool = False,
+            model: any = None,
+            decoders: dict = None
+    ) -> Union[int, list]:
+        """Update items by key with the statements of backend dialect."""
+        connector = self.pool.connector
+        columns = list(items[0].keys())
+        if not [c for c in columns if c not in keys_cols]:
+            raise Exception('Data must have columns to update besides the key columns')
+        output = '*' if returning and connector.returning else ''
+        if connector.dialect == 'postgresql':
+            batches = [items]
+            if hasattr(connector, 'copy') and len(items) >= COPY_UPDATE_ROWS:
+                source = f"deebee_update_{re.sub(r'[^0-9a-zA-Z_]', '_', table)}"
+                await self.__execute(con, f'drop table if exists pg_temp.{source}')
+                select = f"select {', '.join(columns)} from {table}"
+                await self.__execute(con, f'create temp table {source} on commit drop as {select} with no data')
+                records = [tuple(item[c] for c in columns) for item in items]
+                await self.__statement(con, f'copy {source}', lambda event: con.copy(source, columns, records))
+                batches = [None]
+        elif connector.dialect in ('sqlite', 'mysql'):
+            step = max(1, MAX_PARAMS // len(columns))
+            batches = [items[start:start + step] for start in range(0, len(items), step)]
+        else:
+            return await self.__update_each(con, table, keys_cols, columns, items, returning, model, decoders)
+        rows = [] if returning else 0
+        for batch in batches:
+            params = self.__params()
+            sql = self.__generate_bulk_update_command(table, params, keys_cols, columns, batch, output)
+            if output:
+                rows.extend(await self.__fetch(con, sql, params.values, model, decoders))
+            elif returning:
+                await self.__execute(con, sql, params.values)
+                rows.extend(await self.__fetch_keys(con, table, keys_cols, batch, model, decoders))
+            else:
+                rows += await self.__execute(con, sql, params.values)
+        return rows
+
+    async def __update_each(
+            self,
+            con,
+            table: str,
+            keys_cols: list,
+            columns: list,
+            items: list,
+            returning: bool = False,
+            model: any = None,
+            decoders: dict = None
+    ) -> Union[int, list]:
+        """Update items one statement by row, to dialects without a multi row update."""
+        params = self.__params()
+        set_section = ', '.join(f'{c} = {params.bind(None)}' for c in columns if c not in keys_cols)
+        where_section = ' and '.join(f'{k} = {params.bind(None)}' for k in keys_cols)
+        sql = f"update {table} set {set_section} where {where_section}"
+        records = [[item[c] for c in columns if c not in keys_cols] + [item[k] for k in keys_cols] for item in items]
+        if self.pool.connector.executemany:
+            count = await self.__execute(con, sql, records, many=True)
+        else:
+            count = 0
+            for record in records:
+                count += await self.__execute(con, sql, record)
+        if returning:
+            return await self.__fetch_keys(con, table, keys_cols, items, model, decoders)
+        return count
+
+    async def __fetch(
+            self,
+            con,
+            sql: str,
+            params: Union[list, tuple],
+            model: any = None,
+            decoders: dict = None
+    ) -> list:
+        """Execute a query on given connection and return all rows."""
+        cur = await con.cursor()
+        try:
+            columns, rows = await self.__statement(con, sql, lambda event: self.__read(cur, sql, params, event))
+        finally:
+            if not con.closed:
+                await cur.close()
+        decode = make_decoder(columns, decoders) if decoders else None
+        if decode:
+            rows = list(map(decode, rows))
+        return make_rows(columns, rows, model=model)
+
+    async def __fetch_keys(
+            self,
+            con,
+            table: str,
+            keys_cols: list,
+            items: list,
+            model: any = None,
+            decoders: dict = None
+    ) -> list:
+        """Read back rows by key values, to backends without returning."""
+        params = self.__params()
+        if len(keys_cols) == 1:
+            where = {f'{keys_cols[0]}__in': [item[keys_cols[0]] for item in items]}
+            where_section = self.__generate_where_section(params, where)
+        else:
+            values = ', '.join(f"({', '.join(params.bind(item[k]) for k in keys_cols)})" for item in items)
+            where_section = f"where ({', '.join(keys_cols)}) in ({values})"
+        sql = f"""select * from {table} {where_section}"""
+        return await self.__fetch(con, sql, params.values, model, decoders)
+
+    @invalidates
     async def update(
             self,
             table: str,
@@ -291,23 +1360,113 @@ class DB:
     ) -> Union[dict, any]:
         """Updates table with given data.
 
+        When data is a list, each item updates the row with its key values, see bulk_update, and the list of
+        rows updated is returned.
+
         :param table:
-        :param key:
+        :param key: key columns, by default the primary key or first unique constraint of table schema.
         :param data:
         :param model:
         :return:
         """
-        keys_cols = key.split(',')
-        if len(keys_cols) == 1 and pk != data.get(key, None):
+        if not isinstance(data, dict):
+            return await self.bulk_update(table, data, key=key, returning=True, model=model)
+        keys_cols = await self.__key_columns(table, key)
+        if len(keys_cols) == 1 and pk != data.get(keys_cols[0], None):
             raise Exception('PK value must be same of data')
-        if isinstance(data, dict):
-            where = {k: data.pop(k) for k in keys_cols}
-        else:
-            where = {k: None for k in keys_cols}
-        sql = self.__generate_update_command(table, data, where=where)
-        data = await self.__query(sql, one=True, model=model)
+        where = {k: data.pop(k) for k in keys_cols}
+        data = await self.__change(table, data, where, model, keys_cols)
         return data
 
+    @invalidates
+    async def bulk_update(
+            self,
+            table: str,
+            rows: Union[Iterable, AsyncIterable],
+            *,
+            key: Union[str, tuple, list] = '',
+            chunk_size: int = 1000,
+            returning: bool = False,
+            model: any = None
+    ) -> Union[int, list]:
+        """Update many rows by key in chunks, each chunk with a single statement.
+
+        Rows are dicts with key columns and columns to set, taken lazily from an iterable or async iterable and
+        written inside a transaction. PostgreSQL joins the table to the chunk typed by the table row type,
+        loading chunks of COPY_UPDATE_ROWS or more rows into a temporary table when the connector supports copy.
+        SQLite updates from a values list and MySQL joins a derived table.
+
+        Returns the number of rows updated, or the updated rows when returning is set.
+
+        :param table:
+        :param rows:
+        :param key: key columns, comma separated or as a list to composite keys. By default the primary key or first
+            unique constraint of table schema.
+        :param chunk_size:
+        :param returning:
+        :param model:
+        :return:
+        """
+        updated = [] if returning else 0
+        chunks = self.__update_chunks(table, rows, key, chunk_size, returning, model)
+        async with contextlib.aclosing(chunks) as results:
+            async for result in results:
+                if returning:
+                    updated.extend(result)
+                else:
+                    updated += result
+        return updated
+
+    async def update_stream(
+            self,
+            table: str,
+            rows: Union[Iterable, AsyncIterable],
+            *,
+            key: Union[str, tuple, list] = '',
+            chunk_size: int = 1000,
+            model: any = None
+    ) -> AsyncIterator[Union[dict, any]]:
+        """Same as bulk_update, yielding the updated rows as each chunk is written.
+
+        The transaction is committed when iteration ends, stopping it early rolls back all chunks.
+
+        :param table:
+        :param rows:
+        :param key:
+        :param chunk_size:
+        :param model:
+        :return:
+        """
+        try:
+            chunks = self.__update_chunks(table, rows, key, chunk_size, True, model)
+            async with contextlib.aclosing(chunks) as results:
+                async for result in results:
+                    for row in result:
+                        yield row
+        finally:
+            self.invalidate(table)
+
+    async def __update_chunks(
+            self,
+            table: str,
+            rows: Union[Iterable, AsyncIterable],
+            key: Union[str, tuple, list],
+            chunk_size: int,
+            returning: bool,
+            model: any
+    ) -> AsyncIterator[Union[int, list]]:
+        keys_cols = await self.__key_columns(table, key)
+        schema = await self.__typed(table)
+        decoders = schema.decoders if schema else None
+        async with self.transaction() as db:
+            con = db.__connection
+            async for chunk in make_chunks(rows, chunk_size):
+                chunk = [row if isinstance(row, dict) else row.dict() for row in chunk]
+                if schema:
+                    chunk = [schema.encode(row) for row in chunk]
+                yield await self.__update_rows(con, table, keys_cols, chunk, returning, model, decoders)
+
+    @invalidates
     async def apply(
             self,
             table: str,
@@ -315,50 +1474,54 @@ class DB:
             key: Union[str, tuple, list] = '',
             sort: Union[str, tuple, list] = '',
             data: Union[dict, list] = None,
-            model: any = None
+            model: any = None,
+            chunk_size: int = 1000
     ):
-        """Verify if each data is in table and choose if call update or insert.
+        """Insert each data or update it when its key is already in table.
+
+        This runs a single native upsert statement by chunk: insert ... on conflict do update in PostgreSQL and
+        SQLite, insert ... on duplicate key update in MySQL. Key and sort columns together identify the row
+        and must have a unique constraint. When data has repeated keys, the last item is kept.
+
+        Returns the row written for a dict or the list of rows written for a list.
 
         :param table:
-        :param key:
+        :param key: key columns, by default the primary key or first unique constraint of table schema.
         :param sort:
         :param data:
         :param model:
+        :param chunk_size:
         :return:
         """
         if not data:
             return data
-        if not key:
-            raise Exception('The key column must be informed!')
-        if isinstance(data, list):
-            keys_cols = key.split(',') or data[0].keys()
-            sort_cols = sort.split(',')
-            where_key = {k: data[0][k] for k in keys_cols}
-            where_sort = {f'{k}__in': [item[k] for item in data] for k in sort_cols}
-            where = {**where_key, **where_sort}
-            column = sort_cols[0] if sort_cols else keys_cols[0]
-            array = self.array(table, column=column, where=where)
-            update_data = []
-            insert_data = []
-            for item in data:
-                if item[column] in array:
-                    update_data.append(item)
+        keys_cols = list(dict.fromkeys(await self.__key_columns(table, key) + make_key_columns(sort)))
+        schema = await self.__typed(table)
+        decoders = schema.decoders if schema else None
+        items = [data] if isinstance(data, dict) else data
+        if schema:
+            items = [schema.encode(item) for item in items]
+        items = {tuple(item[k] for k in keys_cols): item for item in items}
+        items = list(items.values())
+        step = max(1, min(chunk_size, MAX_PARAMS // len(items[0])))
+        rows = []
+        many = len(items) > step
+        async with (self.transaction() if many else self.connection()) as db:
+            con = db.__connection
+            for start in range(0, len(items), step):
+                chunk = items[start:start + step]
+                params = self.__params()
+                sql = self.__generate_upsert_command(table, chunk, params, keys_cols)
+                if self.pool.connector.returning:
+                    rows.extend(await self.__fetch(con, sql, params.values, model, decoders))
                 else:
-                    insert_data.append(item)
-            resp = await asyncio.gather(
-                self.update(table, key=key, data=update_data, model=model),
-                self.insert(table, data=insert_data, model=model)
-            )
-            return resp
-        else:
-            keys_cols = key.split(',') or data.keys()
-            count = await self.count(table, where={k: data[k] for k in keys_cols})
-            if count:
-                data = await self.update(table, key=key, data=data, model=model)
-            else:
-                data = await self.insert(table, data=data, model=model)
-            return data
+                    await self.__execute(con, sql, params.values)
+                    rows.extend(await self.__fetch_keys(con, table, keys_cols, chunk, model, decoders))
+        if isinstance(data, dict):
+            return rows[0] if rows else None
+        return rows
 
+    @invalidates
     async def change(
             self,
             table: str,
@@ -377,33 +1540,252 @@ class DB:
         :param model:
         :return:
         """
-        sql = self.__generate_update_command(table, data, where=where)
-        data = await self.__query(sql, one=True, model=model)
+        data = await self.__change(table, data, where, model)
         return data
 
+    async def __change(
+            self,
+            table: str,
+            data: Union[dict, list],
+            where: dict,
+            model: any = None,
+            keys_cols: list = None
+    ) -> Union[dict, any]:
+        if isinstance(data, dict):
+            schema = await self.__typed(table)
+            decoders = None
+            if schema:
+                data, where, decoders = schema.encode(data), schema.encode_where(where), schema.decoders
+            if not self.pool.connector.returning:
+                keys_cols = keys_cols or await self.__key_columns(table, '')
+                return await self.__update_read(table, data, where, keys_cols, model, decoders)
+            data_key, values = data_shape(data)
+            where_key, where_values = where_shape(where or {})
+            sql = self.__compiled(
+                ('update', table, data_key, where_key),
+                lambda params: self.__generate_update_command(table, data, params, where=where)
+            )
+            data = await self.__query(
+                sql, params=values + where_values, one=True, model=model, prepare=True, decoders=decoders
+            )
+            return data
+        keys_cols = [identify_operator(k)[0] for k in where or {}]
+        return await self.bulk_update(table, data, key=keys_cols, returning=True, model=model)
+
+    async def __update_read(
+            self,
+            table: str,
+            data: dict,
+            where: dict,
+            keys_cols: list,
+            model: any = None,
+            decoders: dict = None
+    ) -> Union[dict, any]:
+        """Update rows in a transaction and read the first one back by key, to backends without returning."""
+        params = self.__params()
+        where_section = self.__generate_where_section(params, where)
+        lock = ' for update' if self.pool.connector.dialect == 'mysql' else ''
+        async with self.transaction() as db:
+            con = db.__connection
+            sql = f"""select {', '.join(keys_cols)} from {table} {where_section} limit 1{lock}"""
+            found = await self.__fetch(con, sql, params.values)
+            if not found:
+                return None
+            params = self.__params()
+            sql = self.__generate_update_command(table, data, params, where=where, output='')
+            await self.__execute(con, sql, params.values)
+            item = {k: data.get(k, found[0][k]) for k in keys_cols}
+            rows = await self.__fetch_keys(con, table, keys_cols, [item], model, decoders)
+        return rows[0] if rows else None
+
+    @invalidates
     async def delete(
             self,
             table: str,
             *,
             key: str = '',
-            pk: Union[str, int, float] = None
+            pk: Union[str, int, float, tuple] = None,
+            where: dict = None,
+            model: any = None
     ) -> Union[dict, any]:
-        """Remove table row by given key.
+        """Remove table row by given key or conditions and return it.
+
+        Backends supporting returning remove and read the row with a single delete ... returning statement,
+        the others read and remove it inside a transaction.
 
         :param table:
-        :param key:
-        :param pk:
+        :param key: key column, by default the primary key or first unique constraint of table schema when pk
+            is given.
+        :param pk: key value, or tuple of values to composite keys.
+        :param where:
+        :param model:
         :return:
         """
-        where = {key: pk}
-        sql = self.__generate_delete_command(table, where=where)
-        item = await self.get_item(table, key=key, pk=pk)
-        await self.execute(sql)
-        return item
+        if key:
+            where = {key: pk, **(where or {})}
+        elif pk is not None:
+            where = {**make_key_where(await self.__key_columns(table, key), pk), **(where or {})}
+        if not where:
+            raise Exception('The key column or where conditions must be informed!')
+        schema = await self.__typed(table)
+        decoders = None
+        if schema:
+            where, decoders = schema.encode_where(where), schema.decoders
+        if not self.pool.connector.returning:
+            rows = await self.__delete_read(table, where, model, decoders)
+            return rows[0] if rows else {}
+        where_key, values = where_shape(where)
+        sql = self.__compiled(
+            ('delete', table, where_key),
+            lambda params: self.__generate_delete_command(table, params, where=where, output='*')
+        )
+        item = await self.__query(sql, params=values, one=True, model=model, prepare=True, decoders=decoders)
+        return item or {}
+
+    @invalidates
+    async def delete_many(
+            self,
+            table: str,
+            *,
+            where: dict = None,
+            model: any = None,
+            returning: bool = True
+    ) -> Union[list, int]:
+        """Remove all table rows matching conditions.
+
+        Returns the removed rows, read by the delete ... returning statement when backend supports it or
+        inside a transaction before removing them. When returning is False, only the number of rows removed is
+        returned, which avoids reading large deletes back.
+
+        :param table:
+        :param where:
+        :param model:
+        :param returning:
+        :return:
+        """
+        if not where:
+            raise Exception('The where conditions must be informed!')
+        schema = await self.__typed(table)
+        decoders = None
+        if schema:
+            where, decoders = schema.encode_where(where), schema.decoders
+        if returning and not self.pool.connector.returning:
+            return await self.__delete_read(table, where, model, decoders)
+        where_key, values = where_shape(where)
+        output = '*' if returning else ''
+        sql = self.__compiled(
+            ('delete', table, where_key, output),
+            lambda params: self.__generate_delete_command(table, params, where=where, output=output)
+        )
+        if returning:
+            return await self.__query(sql, params=values, model=model, prepare=True, decoders=decoders) or []
+        con = await self.__acquire()
+        try:
+            return await self.__execute(con, sql, values)
+        finally:
+            await self.__release(con)
+
+    async def __delete_read(
+            self,
+            table: str,
+            where: dict,
+            model: any = None,
+            decoders: dict = None
+    ) -> list:
+        """Read and remove rows in a transaction, to backends without returning."""
+        params = self.__params()
+        where_section = self.__generate_where_section(params, where)
+        lock = ' for update' if self.pool.connector.dialect == 'mysql' else ''
+        async with self.transaction() as db:
+            con = db.__connection
+            sql = f"""select * from {table} {where_section}{lock}"""
+            rows = await self.__fetch(con, sql, params.values, model, decoders)
+            if rows:
+                await self.__execute(con, f"""delete from {table} {where_section}""", params.values)
+        return rows
+
+    async def __cached(
+            self,
+            table: str,
+            key: tuple,
+            ttl: float,
+            load: callable
+    ):
+        """Return the result from cache or load it when DB has a cache and ttl is not zero."""
+        if self.cache is None or ttl == 0 or self.__connection is not None:
+            return await load()
+        return await self.cache.fetch(key, table, load, ttl)
+
+    async def __acquire(self, read: bool = False):
+        if self.__connection is not None:
+            return self.__connection
+        self.__check_released()
+        if read and self.replicas and primary_until.get().get(id(self.pool), 0.0) < time.monotonic():
+            return await self.__replica().acquire()
+        return await self.pool.acquire()
+
+    async def __release(self, con):
+        if con is not self.__connection:
+            await con.release()
+
+    def __replica(self) -> Pool:
+        """Return the replica with fewer requests outstanding, rotating the first one checked to spread ties."""
+        start = next(self.__rotation) % len(self.replicas)
+        return min(self.replicas[start:] + self.replicas[:start], key=lambda pool: pool.outstanding)
+
+    async def __key_columns(
+            self,
+            table: str,
+            key: Union[str, tuple, list]
+    ) -> list[str]:
+        """Return the key columns given, or the key of table schema when key is empty."""
+        keys_cols = make_key_columns(key) or (await self.schema(table)).key
+        if not keys_cols:
+            raise Exception(f'The key column must be informed, table {table} has no primary key or unique constraint!')
+        return keys_cols
+
+    async def __typed(
+            self,
+            table: str
+    ) -> Union[TableSchema, None]:
+        """Return the schema of table when DB is typed."""
+        return await self.schema(table) if self.typed else None
+
+    def __check_released(self):
+        if self.__released:
+            raise Exception('The connection of this DB was released, use it only inside its context!')
+
+    def __wrote(self):
+        if self.read_your_writes and self.replicas:
+            now = time.monotonic()
+            deadlines = {k: until for k, until in primary_until.get().items() if until > now}
+            deadlines[id(self.pool)] = now + self.read_your_writes
+            primary_until.set(deadlines)
+
+    def __params(self) -> Params:
+        return Params(self.pool.paramstyle)
+
+    def __compiled(
+            self,
+            shape: tuple,
+            generate: callable
+    ) -> str:
+        """Return the sql compiled to shape, generating it on cache miss.
+
+        :param shape:
+        :param generate: function that receives a Params and returns the sql.
+        :return:
+        """
+        sql = self.shapes.get(shape)
+        if sql is None:
+            sql = generate(self.__params())
+            self.shapes.put(shape, sql)
+        return sql
 
     def __generate_query_sql(
             self,
             table: str,
+            params: Params,
             columns: Union[list, str, tuple] = '*',
             where: dict = None,
             order: Union[str, dict, list, tuple] = ''
@@ -411,6 +1793,7 @@ class DB:
         """Generate sql query.
 
         :param table:
+        :param params:
         :param columns:
         :param where:
         :param order:
@@ -418,7 +1801,7 @@ class DB:
         """
         where = where or {}
         columns_sql = make_columns_section(columns)
-        where_sql = self.__generate_where_section(where)
+        where_sql = self.__generate_where_section(params, where)
         order_sql = self.__generate_order_section(order)
         sql = f"""select {columns_sql} from {table} {where_sql} {order_sql}"""
         return sql
@@ -427,6 +1810,7 @@ class DB:
             self,
             table: str,
             data: Union[dict, list],
+            params: Params,
             where: dict = None,
             output: str = '*'
     ) -> str:
@@ -434,27 +1818,88 @@ class DB:
 
         :param table:
         :param data:
+        :param params:
         :param where:
         :param output:
         :return:
         """
         if not data:
             return ''
-        set_section = self.__generate_set_section(data)
-        where_section = self.__generate_where_section(where, multi=isinstance(data, list))
-        sql = f"update {table} as u set {set_section} {where_section} returning {output}"
+        set_section = self.__generate_set_section(params, data)
+        where_section = self.__generate_where_section(params, where)
+        sql = f"update {table} as u set {set_section} {where_section}"
+        if output:
+            sql = f"{sql} returning {output}"
+        return sql
+
+    def __generate_bulk_update_command(
+            self,
+            table: str,
+            params: Params,
+            keys: list,
+            columns: list,
+            data: Union[list, None],
+            output: str = ''
+    ) -> str:
+        """Generate update command setting each row to values of data item with same keys.
+
+        PostgreSQL reads data as a json recordset typed by table row type, or from the temporary table loaded by
+        copy when data is None. SQLite updates from a values list, whose columns are named column1, column2...,
+        and MySQL joins a derived table of selects.
+
+        :param table:
+        :param params:
+        :param keys:
+        :param columns:
+        :param data:
+        :param output:
+        :return:
+        """
+        dialect = self.pool.connector.dialect
+        set_columns = [c for c in columns if c not in keys]
+        if dialect == 'mysql':
+            first = ', '.join(f'{self.__build_value(params, v)} as {c}' for c, v in data[0].items())
+            others = ''.join(
+                f" union all select {', '.join(self.__build_value(params, v) for v in item.values())}"
+                for item in data[1:]
+            )
+            on_section = ' and '.join(f'u.{k} = v.{k}' for k in keys)
+            set_section = ', '.join(f'u.{c} = v.{c}' for c in set_columns)
+            return f"update {table} as u join (select {first}{others}) as v on {on_section} set {set_section}"
+        if dialect == 'sqlite':
+            values_section = ', '.join(
+                f"({', '.join(self.__build_value(params, v) for v in item.values())})" for item in data
+            )
+            names = {c: f'v.column{i}' for i, c in enumerate(columns, 1)}
+            set_section = ', '.join(f'{c} = {names[c]}' for c in set_columns)
+            where_section = ' and '.join(f'{table}.{k} = {names[k]}' for k in keys)
+            sql = f"update {table} set {set_section} from (values {values_section}) as v where {where_section}"
+        else:
+            if data is None:
+                source = f"deebee_update_{re.sub(r'[^0-9a-zA-Z_]', '_', table)}"
+            else:
+                records = json.dumps(data, default=_encode_json_value)
+                source = f"json_populate_recordset(null::{table}, {params.bind(records)}::json)"
+            set_section = ', '.join(f'{c} = v.{c}' for c in set_columns)
+            where_section = ' and '.join(f'u.{k} = v.{k}' for k in keys)
+            sql = f"update {table} as u set {set_section} from {source} as v where {where_section}"
+            output = output and f'u.{output}'
+        if output:
+            sql = f"{sql} returning {output}"
         return sql
 
     def __generate_insert_command(
             self,
             table: str,
             data: Union[dict, list, tuple],
+            params: Params,
             output: str = '*'
     ) -> str:
         """Generate insert command
 
         :param table:
         :param data:
+        :param params:
         :param output:
         :return:
         """
@@ -463,62 +1908,96 @@ class DB:
         if isinstance(data, dict):
             data = [data]
         columns = ', '.join(data[0].keys())
-        values_section = ','.join([f"({','.join([self.__build_value(v) for k, v in item.items()])})" for item in data])
-        sql = f"""insert into {table}({columns}) values {values_section} returning {output}"""
+        values_section = ','.join(
+            [f"({','.join([self.__build_value(params, v) for v in item.values()])})" for item in data]
+        )
+        sql = f"""insert into {table}({columns}) values {values_section}"""
+        if output:
+            sql = f"{sql} returning {output}"
+        return sql
+
+    def __generate_upsert_command(
+            self,
+            table: str,
+            data: list,
+            params: Params,
+            keys: list,
+            output: str = '*'
+    ) -> str:
+        """Generate insert command updating rows with conflicting keys.
+
+        :param table:
+        :param data:
+        :param params:
+        :param keys:
+        :param output:
+        :return:
+        """
+        connector = self.pool.connector
+        sql = self.__generate_insert_command(table, data, params, output='')
+        columns = [k for k in data[0].keys() if k not in keys] or keys[:1]
+        if connector.dialect == 'mysql':
+            set_section = ', '.join(f"{k} = values({k})" for k in columns)
+            return f"{sql} on duplicate key update {set_section}"
+        set_section = ', '.join(f"{k} = excluded.{k}" for k in columns)
+        sql = f"{sql} on conflict ({', '.join(keys)}) do update set {set_section}"
+        if output and connector.returning:
+            sql = f"{sql} returning {output}"
         return sql
 
     def __generate_delete_command(
             self,
             table: str,
-            where: dict
+            params: Params,
+            where: dict,
+            output: str = ''
     ) -> str:
         """Generate delete command.
 
         :param table:
+        :param params:
         :param where:
+        :param output:
         :return:
         """
-        where_section = self.__generate_where_section(where)
+        where_section = self.__generate_where_section(params, where)
         sql = f"""delete from {table} {where_section}"""
+        if output:
+            sql = f"{sql} returning {output}"
         return sql
 
     def __generate_where_section(
             self,
-            where: dict = None,
-            multi=False
+            params: Params,
+            where: dict = None
     ) -> str:
         """Generate where section.
 
+        :param params:
         :param where:
-        :param multi:
         :return:
         """
         if not where:
             return ''
-        sql = ' and '.join([self.__mount_where_pair(k, v, multi) for k, v in where.items()])
+        sql = ' and '.join([self.__mount_where_pair(params, k, v) for k, v in where.items()])
         if sql:
             sql = f"where {sql}"
         return sql
 
     def __generate_set_section(
             self,
+            params: Params,
             data: dict = None
     ) -> str:
         """Generate set section.
 
+        :param params:
         :param data:
         :return:
         """
         if not data:
             return ''
-        if isinstance(data, dict):
-            sql = ', '.join([f"{k} = {self.__build_value(v)}" for k, v in data.items()])
-        else:
-            columns = data[0].keys()
-            set_columns_section = ', '.join(f"{k} = u2.{k}" for k in columns)
-            values_section = ', '.join(f"({','.join([self.__build_value(v) for k, v in item.items()])})" for item in data)
-            columns_section = ', '.join(k for k in columns)
-            sql = f"{set_columns_section} from (values {values_section}) as u2({columns_section})"
+        sql = ', '.join([f"{k} = {self.__build_value(params, v)}" for k, v in data.items()])
         return sql
 
     def __generate_order_section(
@@ -534,65 +2013,75 @@ class DB:
         if isinstance(order, str):
             cols = order.split(',')
         sql = ','.join(cols)
+        if sql:
+            sql = f"order by {sql}"
         return sql
 
+    def __generate_seek_section(
+            self,
+            params: Params,
+            bound: tuple = None,
+            terms: list = None
+    ) -> str:
+        """Generate the keyset predicate from pairs made by make_seek_pairs.
+
+        Values are always bound, since they come from cursors given by clients. The bound is bound first, in the
+        order its placeholder is written, as numeric placeholders are numbered by bind order.
+
+        :param params:
+        :param bound:
+        :param terms:
+        :return:
+        """
+        def mount(key, value):
+            name, operator, _ = identify_operator(key)
+            return f"{name} {operator} {params.bind(value)}"
+
+        if len(terms) == 1:
+            return f"({mount(*terms[0][0])})"
+        bound_sql = mount(*bound) if bound else ''
+        sql = ' or '.join(f"({' and '.join(mount(k, v) for k, v in term)})" for term in terms)
+        if bound_sql:
+            sql = f"{bound_sql} and ({sql})"
+        return f"({sql})"
+
     def __build_value(
             self,
+            params: Params,
             value: any,
             code: str = ''
     ) -> str:
-        """Return correct value by type.
+        """Return placeholders to value and bind it to params.
 
+        :param params:
         :param value:
         :param code:
         :return:
         """
-        if code in ('starts', 'st'):
-            return f"'{value}%'"
-        if code in ('ends', 'ed'):
-            return f"'%{value}'"
-        if code in ('contains', 'ct'):
-            return f"'%{value}%'"
+        values = make_values(value, code)
         if code in ('between', 'bw'):
-            if isinstance(value, (int, float)):
-                return f"{value[0]} and {value[1]}"
-            return f"'{value[0]}' and '{value[1]}'"
+            return f"{params.bind(values[0])} and {params.bind(values[1])}"
         if code in ('in', 'nin'):
-            return f"""({f','.join((f"{v}" if isinstance(v, (int, float, bool)) else f"'{v}'" for v in value))})"""
-        if isinstance(value, (int, float)):
-            return f'{value}'
-        if isinstance(value, bool):
-            return "true" if value else "false"
-        if isinstance(value, datetime.datetime):
-            return f"'{value.isoformat()}'"
-        if isinstance(value, datetime.date):
-            return f"'{value.strftime('%Y-%m-%d')}'"
-        if value is None:
-            return 'null'
-        if value.startswith('ST_'):
+            return f"({','.join(params.bind(v) for v in values)})"
+        if not values:
             return value
-        if isinstance(value, str):
-            value = value.replace("'", "''").replace("’", "''")
-        return f"'{value}'"
+        return params.bind(values[0])
 
     def __mount_where_pair(
             self,
+            params: Params,
             key: str,
-            value: any,
-            multi: bool = False
+            value: any
     ) -> str:
         """
 
+        :param params:
         :param key:
         :param value:
-        :param multi:
         :return:
         """
         name, operator, code = identify_operator(key)
-        if multi:
-            ret = f"u2.{name} {operator} u.{name}"
-        else:
-            ret = f"{name} {operator} {self.__build_value(value, code)}"
+        ret = f"{name} {operator} {self.__build_value(params, value, code)}"
         return ret
 
     async def __query(
@@ -605,7 +2094,11 @@ class DB:
             last=False,
             value=False,
             model=None,
-            timeout=None
+            timeout=None,
+            prepare=False,
+            row_format='dict',
+            read=False,
+            decoders=None
     ) -> Union[list, tuple, dict, any]:
         """Execute all queries mounted by class.
 
@@ -617,33 +2110,138 @@ class DB:
         :param value:
         :param model:
         :param timeout:
+        :param prepare:
+        :param row_format:
+        :param read: send to a replica when there are replicas.
+        :param decoders: function converting values by column name.
         :return:
         """
-        con = await self.pool.acquire()
-        cur = await con.cursor()
+        timeout = self.timeout if timeout is None else timeout
+        event = QueryEvent(sql) if self.hooks else UNTIMED
+        con = await self.__acquire(read)
+        event.lap('wait')
+        cur = None
         try:
-            await cur.execute(sql, params, timeout=timeout)
+            if prepare:
+                sql = await self.__guard(con, con.prepare(sql), timeout)
+            cur = await con.cursor()
+            event.lap('prepare')
+            columns, fetched = await self.__guard(con, self.__run(cur, sql, params, select, one, last, event), timeout)
             if select:
-                columns = [col.name for col in cur.description]
+                decode = make_decoder(columns, decoders) if decoders else None
+                if decode:
+                    fetched = decode(fetched) if one else list(map(decode, fetched))
                 if one:
-                    item = await cur.fetchone()
                     if value:
-                        data = item[0] if item else None
+                        data = fetched[0] if fetched else None
                     else:
-                        data = dict(zip(columns, item))
-                        if model:
-                            data = model(**data)
+                        data = make_row(columns, fetched, row_format, model)
                 else:
-                    rows = await cur.fetchall()
-                    if model:
-                        data = [model(**{pair[0]: pair[1] for pair in list(zip(columns, item))}) for item in rows]
-                    else:
-                        data = [dict(zip(columns, item)) for item in rows]
+                    data = make_rows(columns, fetched, row_format, model)
+                event.lap('materialize')
                 return data
             else:
                 ...
-        except Exception as e:
-            raise Exception(e)
+        except BaseException as e:
+            event.fail(e)
+            raise
         finally:
-            cur.close()
-            await con.close()
+            if cur is not None and not con.closed:
+                await cur.close()
+            await self.__release(con)
+            if event is not UNTIMED:
+                event.finish()
+                emit(self.hooks, event)
+
+    async def __statement(
+            self,
+            con,
+            sql: str,
+            run: callable
+    ) -> any:
+        """Run a statement on a connection held by helper, under DB timeout, and emit its QueryEvent to hooks.
+
+        :param con:
+        :param sql: statement, used by the event.
+        :param run: function receiving the event and returning the coroutine running the statement.
+        :return:
+        """
+        event = QueryEvent(sql) if self.hooks else UNTIMED
+        try:
+            result = await self.__guard(con, run(event), self.timeout)
+            event.lap('execute')
+            return result
+        except BaseException as e:
+            event.fail(e)
+            raise
+        finally:
+            if event is not UNTIMED:
+                event.finish()
+                emit(self.hooks, event)
+
+    async def __execute(
+            self,
+            con,
+            sql: str,
+            params: Union[list, tuple] = None,
+            many: bool = False
+    ) -> int:
+        """Execute a command on given connection, or once to each params when many, and return the rows affected.
+
+        The cursor is opened and closed out of the statement timeout, since closing it waits the statement on
+        some drivers, which would hold the cancel until the statement ends.
+        """
+        cur = await con.cursor()
+        try:
+            if many:
+                await self.__statement(con, sql, lambda event: cur.executemany(sql, params))
+                return len(params)
+            await self.__statement(con, sql, lambda event: cur.execute(sql, params))
+            return cur.rowcount
+        finally:
+            if not con.closed:
+                await cur.close()
+
+    @staticmethod
+    async def __guard(con, run, timeout: float) -> any:
+        """Await run within timeout, canceling the statement on server when it times out or its task is cancelled.
+
+        The connection is reset or discarded by cancel, so it is never released with the statement running.
+        """
+        try:
+            return await (run if timeout is None else asyncio.wait_for(run, timeout))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            await asyncio.shield(con.cancel())
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise QueryTimeout(f'Query canceled after {timeout} seconds') from None
+
+    @staticmethod
+    async def __read(cur, sql, params, event) -> tuple:
+        """Execute a query on cursor and fetch all rows, returning the columns and the rows."""
+        await cur.execute(sql, params)
+        event.lap('execute')
+        columns = [col[0] for col in cur.description]
+        rows = await cur.fetchall()
+        event.lap('fetch', rows=len(rows))
+        return columns, rows
+
+    @staticmethod
+    async def __run(cur, sql, params, select, one, last, event) -> tuple:
+        """Execute the statement and fetch its rows, returning the columns and the rows or the single row."""
+        await cur.execute(sql, params)
+        event.lap('execute')
+        if not select:
+            return None, None
+        columns = [col[0] for col in cur.description]
+        if not one:
+            rows = await cur.fetchall()
+            event.lap('fetch', rows=len(rows))
+            return columns, rows
+        if last:
+            rows = await cur.fetchall()
+            item = rows[-1] if rows else None
+        else:
+            item = await cur.fetchone()
+        event.lap('fetch', rows=int(item is not None))
+        return columns, item
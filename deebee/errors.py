@@ -0,0 +1,2 @@
+class QueryTimeout(TimeoutError):
+    """Statement ran longer than its timeout and was canceled."""
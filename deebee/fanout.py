@@ -0,0 +1,94 @@
+import asyncio
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Union
+
+
+async def _enumerate(
+        items: Union[Iterable, AsyncIterable]
+) -> AsyncIterator[tuple[int, any]]:
+    index = 0
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield index, item
+            index += 1
+    else:
+        for item in items:
+            yield index, item
+            index += 1
+
+
+async def fan_out(
+        fn: Callable[[any], Awaitable],
+        items: Union[Iterable, AsyncIterable],
+        concurrency: int,
+        ordered: bool = True,
+        return_exceptions: bool = False
+) -> AsyncIterator:
+    """Yield fn result to each item, running at most concurrency calls at same time.
+
+    Items are taken lazily, and no more than twice concurrency results wait to be consumed, so a slow consumer
+    holds the producers back. When ordered, results follow the items order, otherwise the completion order.
+
+    :param fn: coroutine function called with each item.
+    :param items: iterable or async iterable.
+    :param concurrency: maximum number of calls running.
+    :param ordered:
+    :param return_exceptions: yield the error raised by an item in place of its result, instead of raising it.
+    :return:
+    """
+    if concurrency < 1:
+        raise ValueError('Concurrency must be at least 1')
+    window = asyncio.Semaphore(concurrency * 2)
+    results = asyncio.Queue()
+    source = _enumerate(items)
+    lock = asyncio.Lock()
+    finished = object()
+
+    async def worker():
+        while True:
+            await window.acquire()
+            async with lock:
+                try:
+                    index, item = await source.__anext__()
+                except StopAsyncIteration:
+                    window.release()
+                    return
+                except BaseException as e:
+                    results.put_nowait((None, e, True))
+                    raise
+            try:
+                results.put_nowait((index, await fn(item), False))
+            except Exception as e:
+                results.put_nowait((index, e, True))
+
+    async def watch():
+        await asyncio.gather(*workers, return_exceptions=True)
+        results.put_nowait(finished)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    watcher = asyncio.ensure_future(watch())
+    pending = {}
+    position = 0
+    try:
+        while (entry := await results.get()) is not finished:
+            index, result, failed = entry
+            if index is None:
+                raise result
+            if not ordered:
+                if failed and not return_exceptions:
+                    raise result
+                window.release()
+                yield result
+                continue
+            pending[index] = (result, failed)
+            while position in pending:
+                result, failed = pending.pop(position)
+                position += 1
+                if failed and not return_exceptions:
+                    raise result
+                window.release()
+                yield result
+    finally:
+        for task in (*workers, watcher):
+            task.cancel()
+        await asyncio.gather(*workers, watcher, return_exceptions=True)
+        await source.aclose()
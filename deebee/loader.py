@@ -0,0 +1,94 @@
+import asyncio
+
+
+class Loader:
+    def __init__(
+            self,
+            db,
+            window: float = 0,
+            max_batch: int = 500
+    ):
+        """Merge item lookups by key made close in time in a single query.
+
+        Lookups to the same table and key column are collected during the window, or until the next
+        loop iteration when window is zero, and loaded with one where key in (...) query. Each caller
+        receives its own row, or an empty dict when it was not found. Rows are matched to lookups by the key
+        value read back, so pk must have the type of the column values, like an int to an integer column.
+
+        :param db: DB used to run the queries.
+        :param window: seconds to wait for more lookups before querying.
+        :param max_batch: maximum number of keys by query.
+        """
+        self.db = db
+        self.window = window
+        self.max_batch = max_batch
+        self.pending: dict[tuple, dict] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    async def load(
+            self,
+            table: str,
+            key: str,
+            pk: any,
+            model: any = None
+    ):
+        """Return the row of table where key column is pk.
+
+        :param table:
+        :param key:
+        :param pk:
+        :param model:
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        group = (table, key)
+        batch = self.pending.get(group)
+        if batch is None:
+            batch = self.pending[group] = {}
+            if self.window:
+                loop.call_later(self.window, self.__dispatch, group)
+            else:
+                loop.call_soon(self.__dispatch, group)
+        future = loop.create_future()
+        batch.setdefault(pk, []).append(future)
+        if len(batch) >= self.max_batch:
+            self.__dispatch(group)
+        row = await future
+        if model and row:
+            return model(**row)
+        return row
+
+    def __dispatch(self, group: tuple):
+        batch = self.pending.get(group)
+        if batch is None:
+            return
+        del self.pending[group]
+        task = asyncio.ensure_future(self.__fetch(group, batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        task.add_done_callback(lambda _: self.__cancel(batch))
+
+    async def __fetch(self, group: tuple, batch: dict):
+        table, key = group
+        try:
+            rows = await self.db.get_list(table, where={f'{key}__in': list(batch)}, page=None, cache_ttl=0)
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        found = {row[key]: row for row in rows}
+        for pk, futures in batch.items():
+            row = found.get(pk, {})
+            for future in futures:
+                if not future.done():
+                    future.set_result(dict(row) if len(futures) > 1 else row)
+
+    @staticmethod
+    def __cancel(batch: dict):
+        """Cancel lookups left waiting by a fetch cancelled, even before it started."""
+        for futures in batch.values():
+            for future in futures:
+                if not future.done():
+                    future.cancel()
@@ -0,0 +1,300 @@
+import collections
+import functools
+import logging
+import math
+import re
+import time
+from typing import Callable
+
+logger = logging.getLogger('deebee')
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|\$\d+|\?")
+_lists = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_rows = re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+')
+_spaces = re.compile(r'\s+')
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(
+        sql: str
+) -> str:
+    """Return the statement shape of sql.
+
+    Literals and placeholders become ?, lists of values and rows of multi row inserts are collapsed to a single
+    (?) and spaces are collapsed, so statements differing only by values have the same shape.
+
+    :param sql:
+    :return:
+    """
+    shape = _literals.sub('?', sql)
+    shape = _lists.sub('(?)', shape)
+    shape = _rows.sub('(?)', shape)
+    return _spaces.sub(' ', shape).strip()
+
+
+class QueryEvent:
+    __slots__ = ('sql', 'start', 'mark', 'wait', 'prepare', 'execute', 'fetch', 'materialize', 'total', 'rows',
+                 'error')
+
+    def __init__(self, sql: str):
+        """Timing of one statement run by DB, in seconds by phase.
+
+        wait is the time acquiring a connection from pool, prepare the time preparing the statement and opening
+        the cursor, execute the time until server answers, fetch the time reading rows from driver and
+        materialize the time building the rows returned.
+
+        :param sql:
+        """
+        self.sql = sql
+        self.start = self.mark = time.perf_counter()
+        self.wait = self.prepare = self.execute = self.fetch = self.materialize = self.total = 0.0
+        self.rows: int = 0
+        self.error: BaseException = None
+
+    @property
+    def shape(self) -> str:
+        return normalize_sql(self.sql)
+
+    def lap(self, phase: str, rows: int = None):
+        now = time.perf_counter()
+        setattr(self, phase, getattr(self, phase) + now - self.mark)
+        self.mark = now
+        if rows is not None:
+            self.rows = rows
+
+    def fail(self, error: BaseException):
+        self.error = error
+
+    def finish(self):
+        self.total = time.perf_counter() - self.start
+
+
+class UntimedEvent:
+    """Stands for QueryEvent when there are no hooks, doing nothing."""
+
+    def lap(self, phase: str, rows: int = None):
+        pass
+
+    def fail(self, error: BaseException):
+        pass
+
+
+UNTIMED = UntimedEvent()
+
+
+class AcquireEvent:
+    __slots__ = ('wait', 'size', 'waiters', 'error')
+
+    def __init__(self, wait: float, size: int, waiters: int, error: BaseException = None):
+        """Connection acquired from pool.
+
+        :param wait: seconds waiting for the connection.
+        :param size: pool size after acquire.
+        :param waiters: acquire calls still waiting in line.
+        :param error: error raised acquiring, like a timeout.
+        """
+        self.wait = wait
+        self.size = size
+        self.waiters = waiters
+        self.error = error
+
+
+def emit(
+        hooks: list,
+        event
+):
+    """Call each hook with event, logging instead of raising hook errors."""
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception:
+            logger.exception('Error in deebee hook %r', hook)
+
+
+class Histogram:
+    def __init__(
+            self,
+            ratio: float = 2 ** 0.125,
+            minimum: float = 1e-6
+    ):
+        """Counts values in exponential buckets, giving percentiles with relative error under ratio - 1.
+
+        :param ratio: growth between bucket bounds.
+        :param minimum: upper bound of the first bucket.
+        """
+        self.log_ratio = math.log(ratio)
+        self.minimum = minimum
+        self.buckets: dict[int, int] = {}
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.max: float = 0.0
+
+    def add(self, value: float):
+        index = math.ceil(math.log(value / self.minimum) / self.log_ratio) if value > self.minimum else 0
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Return the value below which q fraction of values are, as the bound of its bucket.
+
+        :param q: fraction from 0 to 1.
+        :return:
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target:
+                return min(self.minimum * math.exp(index * self.log_ratio), self.max)
+        return self.max
+
+    def stats(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+        }
+
+
+class MetricsRegistry:
+    phases = ('wait', 'prepare', 'execute', 'fetch', 'materialize')
+
+    def __init__(self, max_shapes: int = 1000):
+        """Collects latency histograms by statement shape and of pool waits.
+
+        Add it as hook to DB, and to Pool to also measure acquires outside queries.
+
+            metrics = MetricsRegistry()
+            db.add_hook(metrics)
+            db.pool.add_hook(metrics)
+
+        :param max_shapes: statement shapes tracked, later ones are counted under 'other'.
+        """
+        self.max_shapes = max_shapes
+        self.queries: dict[str, dict] = {}
+        self.pool = {'wait': Histogram(), 'errors': 0}
+
+    def __call__(self, event):
+        if isinstance(event, AcquireEvent):
+            self.pool['wait'].add(event.wait)
+            self.pool['errors'] += event.error is not None
+            return
+        shape = event.shape
+        stats = self.queries.get(shape)
+        if stats is None:
+            if len(self.queries) >= self.max_shapes:
+                shape = 'other'
+                stats = self.queries.get(shape)
+            if stats is None:
+                stats = self.queries[shape] = {
+                    'latency': Histogram(), 'rows': 0, 'errors': 0, **{phase: 0.0 for phase in self.phases}
+                }
+        stats['latency'].add(event.total)
+        stats['rows'] += event.rows
+        stats['errors'] += event.error is not None
+        for phase in self.phases:
+            stats[phase] += getattr(event, phase)
+
+    def stats(self) -> dict:
+        """Return latency percentiles, rows, errors and seconds by phase of each shape, and pool wait percentiles.
+
+        :return:
+        """
+        queries = {
+            shape: {**stats['latency'].stats(), **{k: v for k, v in stats.items() if k != 'latency'}}
+            for shape, stats in self.queries.items()
+        }
+        return {'queries': queries, 'pool': {**self.pool['wait'].stats(), 'errors': self.pool['errors']}}
+
+    def reset(self):
+        self.queries.clear()
+        self.pool = {'wait': Histogram(), 'errors': 0}
+
+
+class SlowQueryLog:
+    def __init__(
+            self,
+            threshold: float = 1.0,
+            maxlen: int = 100,
+            log: Callable = None
+    ):
+        """Keeps and logs statements slower than threshold.
+
+        :param threshold: seconds from which a statement is slow.
+        :param maxlen: number of slow statements kept in entries.
+        :param log: function receiving each slow entry, by default a warning of deebee logger.
+        """
+        self.threshold = threshold
+        self.entries = collections.deque(maxlen=maxlen)
+        self.log = log or self.__warn
+
+    def __call__(self, event):
+        if not isinstance(event, QueryEvent) or event.total < self.threshold:
+            return
+        entry = {
+            'sql': event.sql,
+            'shape': event.shape,
+            'total': event.total,
+            **{phase: getattr(event, phase) for phase in MetricsRegistry.phases},
+            'rows': event.rows,
+            'error': repr(event.error) if event.error is not None else None,
+        }
+        self.entries.append(entry)
+        self.log(entry)
+
+    @staticmethod
+    def __warn(entry: dict):
+        logger.warning(
+            'Slow query %.3fs (wait %.3fs, execute %.3fs, fetch %.3fs) %s rows: %s',
+            entry['total'], entry['wait'], entry['execute'], entry['fetch'], entry['rows'], entry['shape']
+        )
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(
+        registry: MetricsRegistry,
+        prefix: str = 'deebee'
+) -> str:
+    """Return the registry metrics in Prometheus text exposition format.
+
+    :param registry:
+    :param prefix: prefix of metric names.
+    :return:
+    """
+    lines = [
+        f'# HELP {prefix}_query_seconds Statement latency by shape.',
+        f'# TYPE {prefix}_query_seconds summary',
+    ]
+    for shape, stats in registry.queries.items():
+        label = f'shape="{_label(shape)}"'
+        histogram = stats['latency']
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f'{prefix}_query_seconds{{{label},quantile="{q}"}} {histogram.percentile(q)}')
+        lines.append(f'{prefix}_query_seconds_sum{{{label}}} {histogram.sum}')
+        lines.append(f'{prefix}_query_seconds_count{{{label}}} {histogram.count}')
+    for name, help_text in (('rows', 'Rows returned by shape.'), ('errors', 'Statements failed by shape.')):
+        lines.append(f'# HELP {prefix}_query_{name}_total {help_text}')
+        lines.append(f'# TYPE {prefix}_query_{name}_total counter')
+        for shape, stats in registry.queries.items():
+            lines.append(f'{prefix}_query_{name}_total{{shape="{_label(shape)}"}} {stats[name]}')
+    wait = registry.pool['wait']
+    lines.append(f'# HELP {prefix}_pool_wait_seconds Time waiting for a pool connection.')
+    lines.append(f'# TYPE {prefix}_pool_wait_seconds summary')
+    for q in (0.5, 0.95, 0.99):
+        lines.append(f'{prefix}_pool_wait_seconds{{quantile="{q}"}} {wait.percentile(q)}')
+    lines.append(f'{prefix}_pool_wait_seconds_sum {wait.sum}')
+    lines.append(f'{prefix}_pool_wait_seconds_count {wait.count}')
+    lines.append(f'# HELP {prefix}_pool_acquire_errors_total Failed pool acquires.')
+    lines.append(f'# TYPE {prefix}_pool_acquire_errors_total counter')
+    lines.append(f'{prefix}_pool_acquire_errors_total {registry.pool["errors"]}')
+    return '\n'.join(lines) + '\n'
@@ -1,21 +1,352 @@
+import asyncio
+import time
+from collections import deque
+
+from deebee.backends import get_backend
 from deebee.connection import Connection
+from deebee.metrics import AcquireEvent, emit
 
 
 class Pool:
-    def __init__(self):
-        self.connections = {}
-        self.waiting = []
-        self.running = []
+    def __init__(
+            self,
+            backend: str = None,
+            *,
+            params: dict = None,
+            base_key: str = '',
+            min_size: int = 1,
+            max_size: int = 10,
+            timeout: float = None,
+            statement_cache_size: int = 100,
+            max_idle_time: float = None,
+            max_lifetime: float = None,
+            max_queries: int = None,
+            ping_after: float = None,
+            ping_timeout: float = 1.0,
+            reap_interval: float = None
+    ):
+        """Keeps connections opened to be reused by many queries.
+
+        Idle connections stay in the waiting list and the ones checked out stay in the running list. When the
+        pool is exhausted, acquire calls are queued in arrival order until a connection is released or the
+        timeout is reached.
+
+        :param backend: name of registered backend, by default DEEBEE_TYPE environment variable or sqlite.
+        :param params: connection params given to connector, by default they are read from environment.
+        :param base_key: read params from DB_<BASE_KEY>_* environment variables through connector get_db_params.
+        :param min_size: number of connections opened when pool is initialized.
+        :param max_size: maximum number of connections opened at same time.
+        :param timeout: default seconds to wait for a free connection. None waits forever.
+        :param statement_cache_size: prepared statements kept by each connection, zero disables it.
+        :param max_idle_time: seconds a connection may stay idle, after that it is closed while pool is above min_size.
+        :param max_lifetime: seconds a connection may stay opened, after that it is closed when idle or released.
+        :param max_queries: statements run by a connection before it is closed when released.
+        :param ping_after: seconds idle after which a connection is pinged on checkout, dead ones are replaced.
+        :param ping_timeout: seconds to wait the ping answer.
+        :param reap_interval: seconds between checks of idle connections, by default half the smallest limit.
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('Pool sizes must be 0 <= min_size <= max_size and max_size >= 1')
+        self.backend = backend
+        self.connector = get_backend(backend)
+        if not params and base_key:
+            params = self.connector.get_db_params(base_key=base_key)
+        self.params = params or {}
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+        self.max_idle_time = max_idle_time
+        self.max_lifetime = max_lifetime
+        self.max_queries = max_queries
+        self.ping_after = ping_after
+        self.ping_timeout = ping_timeout
+        limits = [limit for limit in (max_idle_time, max_lifetime) if limit is not None]
+        self.reap_interval = reap_interval or (min(limits) / 2 if limits else None)
+        self.waiting: list[Connection] = []
+        self.running: list[Connection] = []
+        self.opening: int = 0
+        self.closed: bool = False
+        self.initialized: bool = False
+        self.hooks: list = []
+        self.__waiters: deque[asyncio.Future] = deque()
+        self.__drained: asyncio.Event = None
+        self.__reaper: asyncio.Task = None
+
+    @property
+    def paramstyle(self) -> str:
+        return self.connector.paramstyle
+
+    @property
+    def outstanding(self) -> int:
+        """Number of connections in use plus acquires waiting in line."""
+        return len(self.running) + len(self.__waiters)
+
+    @property
+    def size(self) -> int:
+        return len(self.waiting) + len(self.running) + self.opening
+
+    async def initialize(self):
+        """Open the minimal number of connections.
+
+        :return:
+        """
+        self.initialized = True
+        if self.reap_interval and self.__reaper is None and not self.closed:
+            self.__reaper = asyncio.get_running_loop().create_task(self.__reap())
+        missing = self.min_size - self.size
+        if missing <= 0:
+            return
+        self.opening += missing
+        results = await asyncio.gather(*(self.__open() for _ in range(missing)), return_exceptions=True)
+        errors = []
+        for result in results:
+            if isinstance(result, BaseException):
+                errors.append(result)
+                continue
+            self.opening -= 1
+            self.__put(result)
+        if errors and len(errors) == missing:
+            raise errors[0]
+
+    async def acquire(
+            self,
+            timeout: float = None
+    ) -> Connection:
+        """Return a connection from pool.
+
+        An idle connection is returned when available, otherwise a new one is opened while the pool
+        is not full. With a full pool, the caller waits in line for a released connection.
+
+        :param timeout: seconds to wait for a connection, defaults to pool timeout.
+        :return:
+        """
+        if self.closed:
+            raise Exception('Pool is closed')
+        if not self.initialized:
+            await self.initialize()
+        timeout = self.timeout if timeout is None else timeout
+        if not self.hooks:
+            return await self.__wait(timeout)
+        start = time.perf_counter()
+        error = None
+        try:
+            return await self.__wait(timeout)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            emit(self.hooks, AcquireEvent(time.perf_counter() - start, self.size, len(self.__waiters), error))
+
+    def add_hook(self, hook):
+        """Add a function called with an AcquireEvent after each acquire.
+
+        :param hook:
+        :return:
+        """
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    async def __wait(self, timeout: float = None) -> Connection:
+        if timeout is None:
+            return await self.__acquire()
+        try:
+            return await asyncio.wait_for(self.__acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f'Timeout acquiring connection after {timeout} seconds') from None
+
+    async def release(
+            self,
+            con: Connection
+    ):
+        """Give back the connection to pool.
+
+        Healthy connections are handed to the first waiter or kept idle. Closed connections are discarded
+        and their slot is offered to the next waiter. Connections not in use, like ones already released or
+        dropped by close, are ignored.
 
-    async def acquire(self):
-        if self.waiting:
+        :param con:
+        :return:
+        """
+        if con not in self.running:
+            return
+        self.running.remove(con)
+        if self.closed or con.closed or self.__expired(con, time.monotonic()):
+            if not con.closed:
+                await con.close()
+            self.__wake()
+            self.__check_drained()
+            return
+        self.__put(con)
+
+    async def close(
+            self,
+            timeout: float = None
+    ):
+        """Close all connections.
+
+        Queued acquires are cancelled, idle connections are closed and connections in use are closed as
+        soon as they are released. When timeout is reached the ones still in use are closed anyway.
+
+        :param timeout:
+        :return:
+        """
+        self.closed = True
+        self.__stop_reaper()
+        while self.__waiters:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(Exception('Pool is closed'))
+        idle, self.waiting = self.waiting, []
+        await asyncio.gather(*(con.close() for con in idle), return_exceptions=True)
+        if self.running:
+            self.__drained = asyncio.Event()
+            try:
+                await asyncio.wait_for(self.__drained.wait(), timeout)
+            except asyncio.TimeoutError:
+                running, self.running = self.running, []
+                await asyncio.gather(*(con.close() for con in running), return_exceptions=True)
+
+    def terminate(self):
+        """Close the pool without waiting, used when there is no running loop to await close.
+
+        :return:
+        """
+        self.closed = True
+        self.__stop_reaper()
+        connections = self.waiting + self.running
+        self.waiting, self.running = [], []
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        for con in connections:
+            loop.create_task(con.close())
+
+    async def __acquire(self) -> Connection:
+        while self.waiting and not self.__waiters:
             con = self.waiting.pop()
-        else:
-            con = Connection(pool=self)
+            if con.closed:
+                continue
+            self.running.append(con)
+            if await self.__check(con):
+                return con
+            self.running.remove(con)
+            await con.close()
+            self.__wake()
+        if self.size < self.max_size and not self.__waiters:
+            self.opening += 1
+            return self.__checkout(await self.__open())
+        waiter = asyncio.get_running_loop().create_future()
+        self.__waiters.append(waiter)
+        try:
+            con = await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.__resume(waiter.result())
+            elif waiter in self.__waiters:
+                self.__waiters.remove(waiter)
+            raise
+        if con is None:
+            return self.__checkout(await self.__open())
+        return con
+
+    async def __open(self) -> Connection:
+        """Open a new connection to a slot already reserved in opening counter."""
+        con = Connection(pool=self)
+        try:
             await con.initialize()
+        except BaseException:
+            self.opening -= 1
+            self.__wake()
+            raise
         return con
 
-    def close(self):
-        ...
+    def __checkout(self, con: Connection) -> Connection:
+        self.opening -= 1
+        self.running.append(con)
+        return con
+
+    async def __check(self, con: Connection) -> bool:
+        """Return if an idle connection checked out can be used, pinging it when idle for too long."""
+        now = time.monotonic()
+        idle = now - con.last_used
+        if self.__expired(con, now) or (self.max_idle_time is not None and idle > self.max_idle_time):
+            return False
+        if self.ping_after is not None and idle > self.ping_after:
+            return await con.ping(self.ping_timeout)
+        return True
+
+    def __expired(self, con: Connection, now: float) -> bool:
+        if self.max_lifetime is not None and now - con.created > self.max_lifetime:
+            return True
+        return self.max_queries is not None and con.queries >= self.max_queries
+
+    async def __reap(self):
+        """Close idle connections over max_idle_time or max_lifetime and open new ones up to min_size."""
+        while not self.closed:
+            await asyncio.sleep(self.reap_interval)
+            now = time.monotonic()
+            removable = self.size - self.min_size
+            stale = []
+            for con in list(self.waiting):
+                idle = self.max_idle_time is not None and now - con.last_used > self.max_idle_time
+                if con.closed or self.__expired(con, now) or (idle and removable > len(stale)):
+                    self.waiting.remove(con)
+                    stale.append(con)
+            await asyncio.gather(*(con.close() for con in stale), return_exceptions=True)
+            if stale:
+                self.__wake()
+            if not self.closed:
+                try:
+                    await self.initialize()
+                except Exception:
+                    pass
+
+    def __stop_reaper(self):
+        if self.__reaper is not None:
+            self.__reaper.cancel()
+            self.__reaper = None
+
+    def __put(self, con: Connection):
+        """Hand over the connection to first waiter or keep it idle."""
+        if con in self.running:
+            self.running.remove(con)
+        if self.closed:
+            asyncio.get_running_loop().create_task(con.close())
+            self.__check_drained()
+            return
+        while self.__waiters:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                self.running.append(con)
+                waiter.set_result(con)
+                return
+        con.last_used = time.monotonic()
+        self.waiting.append(con)
+        self.__check_drained()
+
+    def __resume(self, con: Connection):
+        """Give back what a cancelled waiter received."""
+        if con is None:
+            self.opening -= 1
+            self.__wake()
+        else:
+            self.__put(con)
 
+    def __wake(self):
+        """Offer a free slot to the first waiter, who opens a new connection."""
+        if self.closed or self.size >= self.max_size:
+            return
+        while self.__waiters:
+            waiter = self.__waiters.popleft()
+            if not waiter.done():
+                self.opening += 1
+                waiter.set_result(None)
+                return
 
+    def __check_drained(self):
+        if self.__drained and not self.running:
+            self.__drained.set()
@@ -0,0 +1,137 @@
+import collections
+import dataclasses
+import functools
+
+
+row_formats = ('dict', 'tuple', 'record', 'columnar', 'numpy', 'arrow')
+
+
+@functools.lru_cache(maxsize=256)
+def make_record_class(
+        columns: tuple
+) -> type:
+    """Return a record class to the column set, created only once.
+
+    Records are tuples with __slots__ = () and named fields, so they are built straight from the fetched row
+    without any intermediate dict. Columns that are not valid identifiers are renamed to _<position>.
+
+    :param columns:
+    :return:
+    """
+    return collections.namedtuple('Record', columns, rename=True)
+
+
+@functools.lru_cache(maxsize=256)
+def is_positional(
+        model: type,
+        columns: tuple
+) -> bool:
+    """Return if model init receives the columns as positional arguments in same order.
+
+    :param model:
+    :param columns:
+    :return:
+    """
+    if dataclasses.is_dataclass(model):
+        return tuple(f.name for f in dataclasses.fields(model) if f.init) == columns
+    return tuple(getattr(model, '_fields', ())) == columns
+
+
+def make_decoder(
+        columns: list,
+        decoders: dict
+):
+    """Return a function converting the values of a fetched row by the decoders of its columns.
+
+    None is returned when no column has a decoder, so rows are used as fetched.
+
+    :param columns:
+    :param decoders: decoder function by column name.
+    :return:
+    """
+    positions = [(i, decoders[c]) for i, c in enumerate(columns) if c in decoders]
+    if not positions:
+        return None
+
+    def decode(item):
+        if item is None:
+            return None
+        item = list(item)
+        for i, fn in positions:
+            item[i] = fn(item[i])
+        return item
+    return decode
+
+
+def make_row(
+        columns: list,
+        item,
+        row_format: str = 'dict',
+        model: any = None
+):
+    """Return one fetched row in the format asked.
+
+    :param columns:
+    :param item:
+    :param row_format:
+    :param model:
+    :return:
+    """
+    if item is None:
+        return None
+    if model:
+        if is_positional(model, tuple(columns)):
+            return model(*item)
+        return model(**dict(zip(columns, item)))
+    if row_format == 'dict':
+        return dict(zip(columns, item))
+    if row_format == 'tuple':
+        return tuple(item)
+    if row_format == 'record':
+        return make_record_class(tuple(columns))._make(item)
+    raise ValueError(f'Row format {row_format} can not be used to a single row')
+
+
+def make_rows(
+        columns: list,
+        items: list,
+        row_format: str = 'dict',
+        model: any = None
+):
+    """Return the fetched rows in the format asked.
+
+    dict and tuple formats return a list of dicts or tuples, record returns a list of record instances,
+    columnar returns a dict with a list of values by column, numpy a dict with an array by column and arrow a
+    pyarrow RecordBatch, built column by column from the fetched rows. When model is set, a list of model
+    instances is returned.
+
+    :param columns:
+    :param items:
+    :param row_format:
+    :param model:
+    :return:
+    """
+    if model:
+        if is_positional(model, tuple(columns)):
+            return [model(*item) for item in items]
+        return [model(**dict(zip(columns, item))) for item in items]
+    if row_format == 'dict':
+        return [dict(zip(columns, item)) for item in items]
+    if row_format == 'tuple':
+        return [tuple(item) for item in items]
+    if row_format == 'record':
+        make = make_record_class(tuple(columns))._make
+        return [make(item) for item in items]
+    if row_format in ('columnar', 'numpy'):
+        values = list(map(list, zip(*items))) if items else [[] for _ in columns]
+        if row_format == 'numpy':
+            import numpy
+
+            values = [numpy.array(column) for column in values]
+        return dict(zip(columns, values))
+    if row_format == 'arrow':
+        import pyarrow
+
+        values = zip(*items) if items else [[] for _ in columns]
+        return pyarrow.record_batch([pyarrow.array(column) for column in values], names=list(columns))
+    raise ValueError(f'Unknown row format {row_format}, use one of {row_formats}')
@@ -0,0 +1,288 @@
+import datetime
+import decimal
+import json
+import re
+import uuid
+from typing import Callable
+
+from deebee.rows import make_rows
+
+kinds = {
+    'integer': {'int', 'integer', 'smallint', 'bigint', 'mediumint', 'tinyint', 'int2', 'int4', 'int8', 'serial',
+                'bigserial', 'smallserial'},
+    'float': {'real', 'float', 'double', 'float4', 'float8'},
+    'decimal': {'numeric', 'decimal'},
+    'boolean': {'bool', 'boolean'},
+    'text': {'text', 'varchar', 'char', 'character', 'clob', 'nvarchar', 'nchar', 'tinytext', 'mediumtext',
+             'longtext', 'citext', 'enum'},
+    'json': {'json', 'jsonb'},
+    'uuid': {'uuid'},
+    'date': {'date'},
+    'datetime': {'datetime', 'timestamp', 'timestamptz'},
+    'time': {'time', 'timetz'},
+    'bytes': {'blob', 'bytea', 'binary', 'varbinary', 'longblob', 'mediumblob', 'tinyblob'},
+}
+
+
+def column_kind(
+        type_name: str
+) -> str:
+    """Return the kind of a column by its declared type, like integer, text or json, or other when unknown.
+
+    :param type_name:
+    :return:
+    """
+    type_name = (type_name or '').lower().strip()
+    if type_name == 'tinyint(1)':
+        return 'boolean'
+    base = re.split(r'[\s(\[]', type_name, maxsplit=1)[0]
+    if type_name.startswith('double precision') or type_name.startswith('character varying'):
+        base = type_name.split(' ')[0]
+    if type_name.startswith('timestamp') or type_name.startswith('time with'):
+        base = 'timestamp' if type_name.startswith('timestamp') else 'time'
+    for kind, names in kinds.items():
+        if base in names:
+            return kind
+    return 'other'
+
+
+def encode_json(value):
+    return json.dumps(value, default=str) if isinstance(value, (dict, list)) else value
+
+
+def encode_text(value):
+    return str(value) if isinstance(value, (uuid.UUID, decimal.Decimal)) else value
+
+
+def encode_iso(value):
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else value
+
+
+def decode_json(value):
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+
+def decode_boolean(value):
+    return bool(value) if isinstance(value, int) else value
+
+
+def decode_decimal(value):
+    return decimal.Decimal(str(value)) if isinstance(value, (int, float, str)) else value
+
+
+def decode_uuid(value):
+    return uuid.UUID(value) if isinstance(value, str) else value
+
+
+def decode_date(value):
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def decode_datetime(value):
+    return datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def decode_time(value):
+    return datetime.time.fromisoformat(value) if isinstance(value, str) else value
+
+
+encoders = {
+    'sqlite': {'json': encode_json, 'uuid': encode_text, 'decimal': encode_text, 'date': encode_iso,
+               'datetime': encode_iso, 'time': encode_iso},
+    'mysql': {'json': encode_json, 'uuid': encode_text},
+    'postgresql': {'json': encode_json, 'uuid': encode_text},
+}
+
+decoders = {
+    'sqlite': {'json': decode_json, 'boolean': decode_boolean, 'decimal': decode_decimal, 'uuid': decode_uuid,
+               'date': decode_date, 'datetime': decode_datetime, 'time': decode_time},
+    'mysql': {'json': decode_json, 'boolean': decode_boolean},
+    'postgresql': {},
+}
+
+
+class Column:
+    def __init__(
+            self,
+            name: str,
+            type_name: str,
+            nullable: bool = True
+    ):
+        """Column of a table schema.
+
+        :param name:
+        :param type_name: type declared in database.
+        :param nullable:
+        """
+        self.name = name
+        self.type_name = type_name
+        self.kind = column_kind(type_name)
+        self.nullable = nullable
+
+    def __repr__(self):
+        return f'Column({self.name!r}, {self.type_name!r})'
+
+
+class TableSchema:
+    def __init__(
+            self,
+            table: str,
+            columns: list[Column],
+            primary_key: list[str] = None,
+            unique: list[list[str]] = None,
+            dialect: str = ''
+    ):
+        """Columns and keys of a table with the encoders and decoders of its columns to the dialect.
+
+        Encoders convert values written to columns into values accepted by driver, like dicts to json columns,
+        and decoders convert values read back, like json text to dicts in backends returning it as text.
+        Columns whose values need no conversion have no encoder or decoder.
+
+        :param table:
+        :param columns:
+        :param primary_key: primary key columns.
+        :param unique: columns of each unique constraint.
+        :param dialect:
+        """
+        self.table = table
+        self.columns = {column.name: column for column in columns}
+        self.primary_key = primary_key or []
+        self.unique = unique or []
+        self.encoders = {
+            c.name: encoders[dialect][c.kind] for c in columns if c.kind in encoders.get(dialect, {})
+        }
+        self.decoders = {
+            c.name: decoders[dialect][c.kind] for c in columns if c.kind in decoders.get(dialect, {})
+        }
+
+    @property
+    def key(self) -> list[str]:
+        """Columns identifying a row, the primary key or the first unique constraint."""
+        if self.primary_key:
+            return self.primary_key
+        return self.unique[0] if self.unique else []
+
+    def encode(self, data: dict) -> dict:
+        """Return data with values of each column converted by its encoder.
+
+        :param data:
+        :return:
+        """
+        encoders = self.encoders
+        if not encoders:
+            return data
+        return {k: encoders[k](v) if k in encoders else v for k, v in data.items()}
+
+    def encode_where(self, where: dict) -> dict:
+        """Return where conditions with values compared to each column converted by its encoder.
+
+        :param where:
+        :return:
+        """
+        encoders = self.encoders
+        if not encoders or not where:
+            return where
+        ret = {}
+        for key, value in where.items():
+            name, _, code = key.partition('__')
+            encode = encoders.get(name)
+            if encode is None or code in ('starts', 'st', 'ends', 'ed', 'contains', 'ct'):
+                ret[key] = value
+            elif code in ('in', 'nin', 'between', 'bw'):
+                ret[key] = [encode(v) for v in value]
+            else:
+                ret[key] = encode(value)
+        return ret
+
+    def __repr__(self):
+        return f'TableSchema({self.table!r}, {list(self.columns)!r}, key={self.key!r})'
+
+
+async def introspect(
+        con,
+        dialect: str,
+        make_params: Callable,
+        table: str
+) -> TableSchema:
+    """Read columns, primary key and unique constraints of table from database catalog.
+
+    :param con: connection used to read the catalog.
+    :param dialect:
+    :param make_params: function returning a new Params to bind values.
+    :param table: table name, optionally qualified by schema.
+    :return:
+    """
+    schema_name, _, name = table.rpartition('.')
+    params = make_params()
+
+    async def fetch(sql, values):
+        cur = await con.cursor()
+        try:
+            await cur.execute(sql, values)
+            columns = [col[0] for col in cur.description]
+            return make_rows(columns, await cur.fetchall(), 'tuple')
+        finally:
+            await cur.close()
+
+    if dialect == 'sqlite':
+        bind = params.bind(name)
+        rows = await fetch(f'select name, type, "notnull", pk from pragma_table_info({bind})', params.values)
+        columns = [Column(n, t, not notnull) for n, t, notnull, _ in rows]
+        if not columns:
+            raise Exception(f'Table {table} was not found')
+        primary_key = [n for n, _, _, pk in sorted(rows, key=lambda row: row[3]) if pk]
+        unique = []
+        indexes = await fetch(f'select name, "unique", origin from pragma_index_list({bind})', params.values)
+        for index, is_unique, origin in indexes:
+            if is_unique and origin != 'pk':
+                index_params = make_params()
+                sql = f'select name from pragma_index_info({index_params.bind(index)}) order by seqno'
+                unique.append([n for n, in await fetch(sql, index_params.values)])
+        return TableSchema(table, columns, primary_key, unique, dialect)
+    if dialect == 'mysql':
+        schema_sql = f'table_schema = {params.bind(schema_name)}' if schema_name else 'table_schema = database()'
+        table_bind = params.bind(name)
+        rows = await fetch(
+            f'select column_name, column_type, is_nullable from information_schema.columns '
+            f'where {schema_sql} and table_name = {table_bind} order by ordinal_position',
+            params.values
+        )
+        columns = [Column(n, t, nullable == 'YES') for n, t, nullable in rows]
+        params = make_params()
+        schema_sql = f'table_schema = {params.bind(schema_name)}' if schema_name else 'table_schema = database()'
+        rows = await fetch(
+            f'select s.index_name, s.column_name from information_schema.statistics s '
+            f'where {schema_sql} and table_name = {params.bind(name)} and non_unique = 0 '
+            f'order by s.index_name, s.seq_in_index',
+            params.values
+        )
+    else:
+        schema_sql = 'table_schema = current_schema()'
+        if schema_name:
+            schema_sql = f'table_schema = {params.bind(schema_name)}'
+        rows = await fetch(
+            f'select column_name, udt_name, is_nullable from information_schema.columns '
+            f'where {schema_sql} and table_name = {params.bind(name)} order by ordinal_position',
+            params.values
+        )
+        columns = [Column(n, t, nullable == 'YES') for n, t, nullable in rows]
+        params = make_params()
+        schema_sql = f'tc.{schema_sql}'
+        if schema_name:
+            schema_sql = f'tc.table_schema = {params.bind(schema_name)}'
+        rows = await fetch(
+            f"select case when tc.constraint_type = 'PRIMARY KEY' then 'PRIMARY' else tc.constraint_name end, "
+            f"kcu.column_name from information_schema.table_constraints tc "
+            f"join information_schema.key_column_usage kcu on kcu.constraint_name = tc.constraint_name "
+            f"and kcu.table_schema = tc.table_schema and kcu.table_name = tc.table_name "
+            f"where {schema_sql} and tc.table_name = {params.bind(name)} "
+            f"and tc.constraint_type in ('PRIMARY KEY', 'UNIQUE') order by tc.constraint_name, kcu.ordinal_position",
+            params.values
+        )
+    if not columns:
+        raise Exception(f'Table {table} was not found')
+    constraints = {}
+    for constraint, column in rows:
+        constraints.setdefault(constraint, []).append(column)
+    primary_key = constraints.pop('PRIMARY', [])
+    return TableSchema(table, columns, primary_key, list(constraints.values()), dialect)
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from typing import Callable
+
+logger = logging.getLogger('deebee')
+
+
+class Writer:
+    def __init__(
+            self,
+            db,
+            table: str,
+            max_batch: int = 1000,
+            max_delay: float = 0.05,
+            max_pending: int = None,
+            on_error: Callable = None
+    ):
+        """Buffer rows written to table and insert them in batches, in background.
+
+        Rows are inserted by bulk_insert, with copy or multi row inserts, when max_batch rows are buffered or
+        the oldest one waited max_delay seconds. When max_pending rows are buffered or being inserted, write
+        waits for room, holding fast producers back. A batch failed by the values of a row, like a constraint
+        violated, is split and inserted again by halves, so only the rows failing alone are reported and the
+        others are written. Other errors, like a lost connection or a missing table, fail the whole batch at
+        once. Rows are not read back.
+
+            async with db.writer('events', max_batch=5000) as w:
+                for event in events:
+                    await w.write(event)
+
+        :param db: DB used to insert the rows.
+        :param table:
+        :param max_batch: rows inserted by statement.
+        :param max_delay: seconds a row waits in buffer before the batch is inserted.
+        :param max_pending: rows buffered or being inserted before write waits, by default four batches.
+        :param on_error: function called with the row and error of each row failed. When given, failures do not
+            need to be retrieved from the futures returned by write.
+        """
+        self.db = db
+        self.table = table
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.on_error = on_error
+        self.written: int = 0
+        self.failed: int = 0
+        self.rows: list[tuple] = []
+        self.closed = False
+        self.__room = asyncio.Semaphore(max_pending or max_batch * 4)
+        self.__ready = asyncio.Event()
+        self.__since = 0.0
+        self.__urgent = False
+        self.__inserting: list[asyncio.Future] = []
+        self.__task = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def write(self, row) -> asyncio.Future:
+        """Buffer row, waiting for room when the writer is full.
+
+        Returns a future resolved when the row is inserted, or with the error raised inserting it.
+
+        :param row: dict or model with dict method.
+        :return:
+        """
+        if self.closed:
+            raise Exception('Writer is closed')
+        await self.__room.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self.rows:
+            self.__since = loop.time()
+            self.__ready.set()
+        self.rows.append((row, future))
+        if len(self.rows) >= self.max_batch:
+            self.__ready.set()
+        if self.__task is None:
+            self.__task = asyncio.ensure_future(self.__run())
+        return future
+
+    async def flush(self):
+        """Insert buffered rows now and wait until all rows written so far are inserted or failed.
+
+        :return:
+        """
+        futures = self.__inserting + [future for _, future in self.rows]
+        if not futures:
+            return
+        self.__urgent = True
+        self.__ready.set()
+        await asyncio.wait(futures)
+
+    async def close(self):
+        """Stop accepting rows and wait for the buffered ones to be inserted.
+
+        :return:
+        """
+        self.closed = True
+        self.__ready.set()
+        if self.__task is not None:
+            await self.__task
+
+    async def __run(self):
+        try:
+            await self.__loop()
+        except BaseException:
+            for _, future in self.rows:
+                future.cancel()
+            raise
+
+    async def __loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.rows:
+                self.__urgent = False
+                if self.closed:
+                    return
+                self.__ready.clear()
+                await self.__ready.wait()
+                continue
+            delay = self.__since + self.max_delay - loop.time()
+            if len(self.rows) < self.max_batch and not self.closed and not self.__urgent and delay > 0:
+                self.__ready.clear()
+                try:
+                    await asyncio.wait_for(self.__ready.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            batch, self.rows = self.rows[:self.max_batch], self.rows[self.max_batch:]
+            self.__since = loop.time()
+            self.__inserting = [future for _, future in batch]
+            try:
+                await self.__insert(batch)
+            finally:
+                self.__inserting = []
+                for _ in batch:
+                    self.__room.release()
+
+    async def __insert(self, batch: list):
+        """Insert batch rows, splitting it in halves when a row fails to find the rows failing."""
+        try:
+            await self.db.bulk_insert(self.table, [row for row, _ in batch], chunk_size=self.max_batch)
+        except Exception as e:
+            if len(batch) > 1 and self.__is_data_error(e):
+                half = len(batch) // 2
+                await self.__insert(batch[:half])
+                await self.__insert(batch[half:])
+                return
+            self.__fail(batch, e)
+            return
+        except BaseException:
+            for _, future in batch:
+                future.cancel()
+            raise
+        self.written += len(batch)
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    def __is_data_error(self, error: Exception) -> bool:
+        is_data_error = getattr(self.db.pool.connector, 'is_data_error', None)
+        return is_data_error is not None and is_data_error(error)
+
+    def __fail(self, batch: list, error: Exception):
+        self.failed += len(batch)
+        for row, future in batch:
+            if not future.done():
+                future.set_exception(error)
+                if self.on_error is not None:
+                    future.exception()
+            if self.on_error is not None:
+                try:
+                    self.on_error(row, error)
+                except Exception:
+                    logger.exception('Error in deebee writer on_error %r', self.on_error)
@@ -0,0 +1,47 @@
+import re
+
+import pytest
+
+from benchmarks import fake
+from deebee import register_backend
+
+register_backend('fake', fake)
+
+SLOW_SQL = 'with recursive c(x) as (select 1 union all select x + 1 from c where x < 50000000) select count(*) from c'
+
+
+@pytest.fixture(autouse=True)
+def fake_result():
+    """Restore the result answered by fake connections after each test."""
+    yield
+    fake.set_result(['id'], [(1,)])
+
+
+@pytest.fixture
+def database(tmp_path) -> str:
+    """Path of a sqlite database file removed after the test."""
+    return str(tmp_path / 'test.db')
+
+
+@pytest.fixture
+def executed(monkeypatch) -> list:
+    """Statements executed on fake connections, as (sql, params) tuples."""
+    statements = []
+    execute = fake.FakeCursor.execute
+
+    async def record(self, sql, params=None):
+        statements.append((sql, list(params or [])))
+        await execute(self, sql, params)
+
+    monkeypatch.setattr(fake.FakeCursor, 'execute', record)
+    return statements
+
+
+def render(sql: str, params: list, style: str) -> str:
+    """Return sql with each placeholder replaced by the repr of the value bound to it, spaces collapsed."""
+    if style == 'numeric':
+        sql = re.sub(r'\$(\d+)', lambda m: repr(params[int(m.group(1)) - 1]), sql)
+    else:
+        values = iter(params)
+        sql = re.sub(r'%s' if style == 'format' else r'\?', lambda m: repr(next(values)), sql)
+    return ' '.join(sql.split())
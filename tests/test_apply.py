@@ -0,0 +1,57 @@
+import asyncio
+
+from benchmarks import fake
+from conftest import render
+from deebee import DB, Pool
+
+
+def test_apply_inserts_and_updates_rows(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute('create table t (id int primary key, v text)')
+        await db.insert('t', data={'id': 1, 'v': 'old'})
+        row = await db.apply('t', key='id', data={'id': 1, 'v': 'new'})
+        rows = await db.apply(
+            't', key='id', data=[{'id': 2, 'v': 'a'}, {'id': 3, 'v': 'b'}, {'id': 2, 'v': 'c'}], chunk_size=1
+        )
+        table = await db.select('select * from t order by id')
+        await db.close()
+        return row, rows, table
+
+    row, rows, table = asyncio.run(main())
+    assert row == {'id': 1, 'v': 'new'}
+    assert sorted(rows, key=lambda r: r['id']) == [{'id': 2, 'v': 'c'}, {'id': 3, 'v': 'b'}]
+    assert table == [{'id': 1, 'v': 'new'}, {'id': 2, 'v': 'c'}, {'id': 3, 'v': 'b'}]
+
+
+def test_apply_is_one_upsert_statement(executed):
+    fake.set_result(['id', 'v'], [(1, 'x')])
+
+    async def main():
+        db = DB(Pool('fake'))
+        rows = await db.apply('t', key='id', data=[{'id': 1, 'v': 'x'}])
+        await db.close()
+        return rows
+
+    assert asyncio.run(main()) == [{'id': 1, 'v': 'x'}]
+    assert [render(sql, params, 'format') for sql, params in executed] == [
+        "insert into t(id, v) values (1,'x') on conflict (id) do update set v = excluded.v returning *"
+    ]
+
+
+def test_apply_reads_rows_back_on_mysql(executed, monkeypatch):
+    monkeypatch.setattr(fake, 'dialect', 'mysql')
+    monkeypatch.setattr(fake, 'returning', False)
+    fake.set_result(['id', 'v'], [(1, 'x')])
+
+    async def main():
+        db = DB(Pool('fake'))
+        row = await db.apply('t', key='id', data={'id': 1, 'v': 'x'})
+        await db.close()
+        return row
+
+    assert asyncio.run(main()) == {'id': 1, 'v': 'x'}
+    assert [render(sql, params, 'format') for sql, params in executed] == [
+        "insert into t(id, v) values (1,'x') on duplicate key update v = values(v)",
+        'select * from t where id in (1)',
+    ]
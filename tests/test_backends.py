@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from benchmarks import fake
+from conftest import render
+from deebee import DB, Pool, TableSchema
+from deebee.backends import get_backend
+from deebee.schema import Column
+
+
+def test_backends_are_imported_on_first_use():
+    assert get_backend('fake') is fake
+    with pytest.raises(Exception, match='not registered'):
+        get_backend('missing')
+
+
+@pytest.fixture
+def mysql(monkeypatch):
+    """Make fake connections behave as a backend without returning, like MySQL."""
+    monkeypatch.setattr(fake, 'dialect', 'mysql')
+    monkeypatch.setattr(fake, 'returning', False)
+    fake.set_result(['id', 'v'], [(1, 'x')])
+
+
+def run(fn):
+    async def main():
+        db = DB(Pool('fake'))
+        db.schemas['t'] = TableSchema('t', [Column('id', 'int', False), Column('v', 'text', True)], ['id'])
+        try:
+            return await fn(db)
+        finally:
+            await db.close()
+
+    return asyncio.run(main())
+
+
+def statements(executed) -> list:
+    return [render(sql, params, 'format') for sql, params in executed]
+
+
+def test_insert_reads_row_back_by_key_without_returning(mysql, executed):
+    row = run(lambda db: db.insert('t', data={'id': 1, 'v': 'x'}))
+    assert row == {'id': 1, 'v': 'x'}
+    assert statements(executed) == ["insert into t(id, v) values (1,'x')", 'select * from t where id in (1)']
+
+
+def test_insert_reads_generated_key_without_returning(mysql, executed):
+    run(lambda db: db.insert('t', data={'v': 'x'}))
+    assert statements(executed) == ["insert into t(v) values ('x')", 'select * from t where id = last_insert_id()']
+
+
+def test_update_and_change_read_rows_back_without_returning(mysql, executed):
+    async def fn(db):
+        updated = await db.update('t', key='id', pk=1, data={'id': 1, 'v': 'y'})
+        changed = await db.change('t', data={'v': 'z'}, where={'v': 'y'})
+        return updated, changed
+
+    assert run(fn) == ({'id': 1, 'v': 'x'}, {'id': 1, 'v': 'x'})
+    sql = statements(executed)
+    assert not [s for s in sql if 'returning' in s]
+    assert sql[:5] == [
+        'begin',
+        'select id from t where id = 1 limit 1 for update',
+        "update t as u set v = 'y' where id = 1",
+        'select * from t where id in (1)',
+        'commit',
+    ]
+    assert sql[6:8] == ["select id from t where v = 'y' limit 1 for update", "update t as u set v = 'z' where v = 'y'"]
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from deebee import DB, Pool
+
+
+def test_batch_resolves_futures_on_exit():
+    async def main():
+        pool = Pool('fake', params={'latency': 0.05}, max_size=5)
+        db = DB(pool)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        async with db.batch() as b:
+            futures = [b.value('select 1'), b.count('t'), b.get_item('t', key='id', pk=1), b.select('select 1')]
+            assert not any(future.done() for future in futures)
+        elapsed = loop.time() - start
+        assert [future.result() for future in futures] == [1, 1, {'id': 1}, [{'id': 1}]]
+        assert elapsed < 0.15
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_batch_errors_resolve_their_own_futures(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        async with db.transaction() as tx:
+            async with tx.batch() as b:
+                ok = b.value('select 1')
+                failed = b.value('select * from missing')
+        assert ok.result() == 1
+        with pytest.raises(Exception, match='missing'):
+            failed.result()
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_batch_is_cancelled_when_context_raises():
+    async def main():
+        db = DB(Pool('fake'))
+        with pytest.raises(ValueError):
+            async with db.batch() as b:
+                future = b.value('select 1')
+                raise ValueError()
+        await db.close()
+        return future
+
+    assert asyncio.run(main()).cancelled()
@@ -0,0 +1,77 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from benchmarks import fake
+from deebee import DB, Pool
+
+
+async def rows_of(count: int):
+    for i in range(count):
+        yield {'id': i, 'v': f'v{i}'}
+
+
+def test_bulk_insert_chunks_rows_from_async_iterable(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute('create table t (id int primary key, v text)')
+        count = await db.bulk_insert('t', rows_of(2500), chunk_size=1000)
+        rows = await db.bulk_insert('t', ({'id': i, 'v': 'r'} for i in range(3000, 3003)), returning=True)
+        total = await db.value('select count(*) from t')
+        await db.close()
+        return count, rows, total
+
+    count, rows, total = asyncio.run(main())
+    assert count == 2500 and total == 2503
+    assert rows == [{'id': 3000, 'v': 'r'}, {'id': 3001, 'v': 'r'}, {'id': 3002, 'v': 'r'}]
+
+
+def test_bulk_insert_is_rolled_back_when_a_chunk_fails(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute('create table t (id int primary key, v text)')
+        rows = [{'id': i % 1500, 'v': 'x'} for i in range(2000)]
+        with pytest.raises(sqlite3.IntegrityError):
+            await db.bulk_insert('t', rows, chunk_size=1000)
+        total = await db.value('select count(*) from t')
+        await db.close()
+        return total
+
+    assert asyncio.run(main()) == 0
+
+
+def test_bulk_insert_copies_each_chunk(monkeypatch):
+    copied = []
+
+    async def copy(con, table, columns, records):
+        copied.append((table, columns, len(records)))
+        return len(records)
+
+    monkeypatch.setattr(fake, 'copy', copy, raising=False)
+
+    async def main():
+        db = DB(Pool('fake'))
+        count = await db.bulk_insert('t', rows_of(25), chunk_size=10)
+        await db.close()
+        return count
+
+    assert asyncio.run(main()) == 25
+    assert copied == [('t', ['id', 'v'], 10), ('t', ['id', 'v'], 10), ('t', ['id', 'v'], 5)]
+
+
+def test_bulk_insert_sends_multi_row_inserts_without_executemany(monkeypatch, executed):
+    monkeypatch.setattr(fake, 'executemany', False)
+
+    async def main():
+        db = DB(Pool('fake'))
+        count = await db.bulk_insert('t', rows_of(5), chunk_size=3)
+        await db.close()
+        return count
+
+    assert asyncio.run(main()) == 5
+    inserts = [(sql, params) for sql, params in executed if sql.startswith('insert')]
+    assert [sql for sql, _ in inserts] == [
+        'insert into t(id, v) values (%s,%s),(%s,%s),(%s,%s)', 'insert into t(id, v) values (%s,%s),(%s,%s)'
+    ]
+    assert inserts[1][1] == [3, 'v3', 4, 'v4']
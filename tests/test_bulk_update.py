@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+from benchmarks import fake
+from conftest import render
+from deebee import DB, Pool
+from deebee.db import _encode_json_value
+
+
+def test_sqlite_update_from_values_with_composite_key(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute('create table t (a int, b text, v text, n int, primary key (a, b))')
+        await db.bulk_insert('t', ({'a': i % 5, 'b': str(i), 'v': 'old', 'n': i} for i in range(20)))
+        count = await db.bulk_update(
+            't', ({'a': i % 5, 'b': str(i), 'v': 'new'} for i in range(0, 20, 2)), key='a,b', chunk_size=3
+        )
+        rows = await db.bulk_update('t', [{'a': 1, 'b': '1', 'v': 'one'}], key=('a', 'b'), returning=True)
+        streamed = [row async for row in db.update_stream('t', [{'a': 3, 'b': '3', 'n': 33}], key=['a', 'b'])]
+        table = await db.select('select a, b, v, n from t order by cast(b as int)', row_format='tuple')
+        await db.close()
+        return count, rows, streamed, table
+
+    count, rows, streamed, table = asyncio.run(main())
+    assert count == 10
+    assert rows == [{'a': 1, 'b': '1', 'v': 'one', 'n': 1}]
+    assert streamed == [{'a': 3, 'b': '3', 'v': 'old', 'n': 33}]
+    assert [v for _, _, v, _ in table] == ['new', 'one', 'new', 'old'] + ['new', 'old'] * 8
+    assert table[3] == (3, '3', 'old', 33)
+
+
+def test_sqlite_update_statement(executed, monkeypatch):
+    monkeypatch.setattr(fake, 'dialect', 'sqlite')
+    monkeypatch.setattr(fake, 'paramstyle', 'qmark')
+
+    async def main():
+        db = DB(Pool('fake'))
+        await db.bulk_update('t', [{'a': 1, 'b': 2, 'v': 'x'}, {'a': 3, 'b': 4, 'v': 'y'}], key='a,b')
+        await db.close()
+
+    asyncio.run(main())
+    updates = [render(sql, params, 'qmark') for sql, params in executed if sql.startswith('update')]
+    assert updates == [
+        "update t set v = v.column3 from (values (1, 2, 'x'), (3, 4, 'y')) as v "
+        "where t.a = v.column1 and t.b = v.column2"
+    ]
+
+
+def test_mysql_and_postgresql_update_statements(executed, monkeypatch):
+    async def main():
+        db = DB(Pool('fake'))
+        await db.bulk_update('t', [{'id': 1, 'v': b'\x01'}], key='id')
+        monkeypatch.setattr(fake, 'dialect', 'mysql')
+        await db.bulk_update('t', [{'id': 1, 'v': 'x'}, {'id': 2, 'v': 'y'}], key='id')
+        await db.close()
+
+    asyncio.run(main())
+    updates = [(sql, params) for sql, params in executed if sql.startswith('update')]
+    assert updates[0] == (
+        'update t as u set v = v.v from json_populate_recordset(null::t, %s::json) as v where u.id = v.id',
+        [json.dumps([{'id': 1, 'v': '\\x01'}])]
+    )
+    assert render(*updates[1], 'format') == (
+        "update t as u join (select 1 as id, 'x' as v union all select 2, 'y') as v on u.id = v.id set u.v = v.v"
+    )
+
+
+def test_json_values_of_postgresql_recordset():
+    assert json.dumps([{'b': b'\x00\xff'}], default=_encode_json_value) == '[{"b": "\\\\x00ff"}]'
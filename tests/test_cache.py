@@ -0,0 +1,66 @@
+import asyncio
+
+from deebee import DB, Pool, ResultCache
+
+
+def test_concurrent_misses_share_one_load():
+    async def main():
+        cache = ResultCache()
+        loads = []
+
+        async def load():
+            loads.append(1)
+            await asyncio.sleep(0.01)
+            return {'v': 1}
+
+        values = await asyncio.gather(*(cache.fetch('k', 't', load) for _ in range(5)))
+        assert values == [{'v': 1}] * 5
+        assert len(loads) == 1
+        assert await cache.fetch('k', 't', load) == {'v': 1}
+        assert len(loads) == 1 and cache.hits == 1
+
+    asyncio.run(main())
+
+
+def test_read_after_invalidate_does_not_join_older_load():
+    async def main():
+        cache = ResultCache()
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def old():
+            started.set()
+            await release.wait()
+            return {'v': 'old'}
+
+        async def new():
+            return {'v': 'new'}
+
+        before = asyncio.ensure_future(cache.fetch('k', 't', old))
+        await started.wait()
+        cache.invalidate('t')
+        assert await asyncio.wait_for(cache.fetch('k', 't', new), 1) == {'v': 'new'}
+        release.set()
+        assert await before == {'v': 'old'}
+        assert cache.get('k') == {'v': 'new'}
+
+    asyncio.run(main())
+
+
+def test_writes_invalidate_cached_reads(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}), cache=ResultCache())
+        await db.execute('create table t (id int primary key, v text)')
+        await db.insert('t', data={'id': 1, 'v': 'old'})
+        assert (await db.get_item('t', key='id', pk=1))['v'] == 'old'
+        assert (await db.get_item('t', key='id', pk=1))['v'] == 'old'
+        assert db.cache.hits == 1
+        await db.update('t', data={'id': 1, 'v': 'new'}, key='id', pk=1)
+        assert (await db.get_item('t', key='id', pk=1))['v'] == 'new'
+        assert await db.count('t') == 1
+        await db.delete('t', key='id', pk=1)
+        assert await db.count('t') == 0
+        assert await db.get_item('t', key='id', pk=1) == {}
+        await db.close()
+
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from deebee import DB, Pool
+
+pyarrow = pytest.importorskip('pyarrow')
+numpy = pytest.importorskip('numpy')
+
+
+def run_with_rows(database, fn, rows=25):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute('create table t (id int, x real, name text)')
+        await db.bulk_insert('t', ({'id': i, 'x': None if i < 3 else i / 2, 'name': f'n{i}'} for i in range(rows)))
+        try:
+            return await fn(db)
+        finally:
+            await db.close()
+
+    return asyncio.run(main())
+
+
+def test_select_arrow_builds_table_from_batches(database):
+    async def fn(db):
+        table = await db.select_arrow('select * from t order by id', batch_size=4)
+        return table, await db.select('select * from t order by id')
+
+    table, rows = run_with_rows(database, fn)
+    assert table.column_names == ['id', 'x', 'name']
+    assert table.num_rows == 25
+    assert table.column('id').num_chunks == 7
+    assert table.schema.field('id').type == pyarrow.int64()
+    assert table.schema.field('x').type == pyarrow.float64()
+    assert table.to_pylist() == rows
+
+
+def test_select_arrow_casts_to_schema(database):
+    schema = pyarrow.schema([('id', pyarrow.int32()), ('x', pyarrow.float64()), ('name', pyarrow.string())])
+
+    async def fn(db):
+        table = await db.select_arrow('select * from t where id < ?', params=[5], batch_size=2, schema=schema)
+        empty = await db.select_arrow('select * from t where id < 0', schema=schema)
+        return table, empty, await db.select_arrow('select * from t where id < 0')
+
+    table, empty, untyped = run_with_rows(database, fn)
+    assert table.schema == schema
+    assert table.column('id').to_pylist() == [0, 1, 2, 3, 4]
+    assert empty.schema == schema and empty.num_rows == 0
+    assert untyped.num_rows == 0
+
+
+def test_select_arrow_rejects_unknown_output_before_query(database):
+    async def fn(db):
+        with pytest.raises(ValueError):
+            await db.select_arrow('select * from missing', output='csv')
+
+    run_with_rows(database, fn, rows=1)
+
+
+def test_select_numpy_concatenates_batches(database):
+    async def fn(db):
+        return await db.select_numpy('select id, name from t order by id', batch_size=4)
+
+    arrays = run_with_rows(database, fn)
+    assert list(arrays) == ['id', 'name']
+    assert arrays['id'].dtype == numpy.int64
+    assert arrays['id'].tolist() == list(range(25))
+    assert arrays['name'].tolist() == [f'n{i}' for i in range(25)]
+
+
+def test_arrow_row_format(database):
+    async def fn(db):
+        return await db.select('select id, name from t where id < 2 order by id', row_format='arrow')
+
+    batch = run_with_rows(database, fn)
+    assert isinstance(batch, pyarrow.RecordBatch)
+    assert batch.to_pylist() == [{'id': 0, 'name': 'n0'}, {'id': 1, 'name': 'n1'}]
@@ -0,0 +1,52 @@
+import asyncio
+
+from benchmarks import fake
+from conftest import render
+from deebee import DB, Pool
+
+
+def test_delete_returns_removed_rows(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute('create table t (id int primary key, v text)')
+        await db.bulk_insert('t', ({'id': i, 'v': 'x' if i % 2 else 'y'} for i in range(10)))
+        row = await db.delete('t', key='id', pk=1)
+        missing = await db.delete('t', pk=1)
+        rows = await db.delete_many('t', where={'v': 'y', 'id__gt': 4})
+        count = await db.delete_many('t', where={'id__in': [3, 5, 6]}, returning=False)
+        left = await db.select('select id from t order by id', row_format='tuple')
+        await db.close()
+        return row, missing, rows, count, left
+
+    row, missing, rows, count, left = asyncio.run(main())
+    assert row == {'id': 1, 'v': 'x'} and missing == {}
+    assert sorted(r['id'] for r in rows) == [6, 8]
+    assert count == 2
+    assert left == [(0,), (2,), (4,), (7,), (9,)]
+
+
+def test_delete_is_one_statement_with_returning(executed):
+    async def main():
+        db = DB(Pool('fake'))
+        await db.delete('t', key='id', pk=1)
+        await db.close()
+
+    asyncio.run(main())
+    assert [render(sql, params, 'format') for sql, params in executed] == ['delete from t where id = 1 returning *']
+
+
+def test_delete_reads_rows_in_transaction_without_returning(executed, monkeypatch):
+    monkeypatch.setattr(fake, 'dialect', 'mysql')
+    monkeypatch.setattr(fake, 'returning', False)
+    fake.set_result(['id'], [(1,)])
+
+    async def main():
+        db = DB(Pool('fake'))
+        row = await db.delete('t', key='id', pk=1)
+        await db.close()
+        return row
+
+    assert asyncio.run(main()) == {'id': 1}
+    assert [render(sql, params, 'format') for sql, params in executed] == [
+        'begin', 'select * from t where id = 1 for update', 'delete from t where id = 1', 'commit'
+    ]
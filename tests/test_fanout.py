@@ -0,0 +1,15 @@
+import asyncio
+
+from deebee import DB, Pool
+
+
+def test_map_releases_all_connections():
+    async def main():
+        pool = Pool('fake', max_size=3)
+        db = DB(pool)
+        results = [rows async for rows in db.map('select 1', [[i] for i in range(10)], concurrency=3)]
+        assert len(results) == 10
+        assert pool.running == [] and len(pool.waiting) <= 3
+        await db.close()
+
+    asyncio.run(main())
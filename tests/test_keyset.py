@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from benchmarks import fake
+from conftest import render
+from deebee import DB, Pool
+from deebee.db import encode_cursor
+
+
+@pytest.mark.parametrize('style', ['format', 'qmark', 'numeric'])
+def test_seek_placeholders_match_values(style, executed, monkeypatch):
+    monkeypatch.setattr(fake, 'paramstyle', style)
+    fake.set_result(['a', 'b', 'c'], [])
+
+    async def main():
+        db = DB(Pool('fake'))
+        await db.get_list('t', where={'c': 'C'}, order='a,b', size=10, after=encode_cursor(['X', 'Y']))
+        await db.close()
+
+    asyncio.run(main())
+    sql, params = executed[-1]
+    text = render(sql, params, style)
+    assert "where c = 'C' and (a >= 'X' and ((a > 'X') or (a = 'X' and b > 'Y')))" in text
+    assert text.endswith('limit 10')
+
+
+@pytest.mark.parametrize('style', ['format', 'qmark', 'numeric'])
+def test_seek_placeholders_with_descending_keys(style, executed, monkeypatch):
+    monkeypatch.setattr(fake, 'paramstyle', style)
+    fake.set_result(['a', 'b', 'c'], [])
+
+    async def main():
+        db = DB(Pool('fake'))
+        await db.get_list('t', where={'c__gt': 0}, order='a desc,b,c desc', size=5, after=encode_cursor([3, 2, 1]))
+        await db.close()
+
+    asyncio.run(main())
+    sql, params = executed[-1]
+    text = render(sql, params, style)
+    assert ('where c > 0 and (a <= 3 and ((a < 3) or (a = 3 and b > 2) or (a = 3 and b = 2 and c < 1)))'
+            in text)
+    assert text.endswith('limit 5')
+
+
+def test_keyset_pages_cover_all_rows(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute('create table t (a int, b int, v text)')
+        await db.bulk_insert('t', ({'a': i % 7, 'b': i, 'v': 'x' if i % 3 else 'y'} for i in range(100)))
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            rows, cursor = await db.get_list('t', where={'v': 'x'}, order='a desc,b', size=9, after=cursor)
+            seen.extend((row['a'], row['b']) for row in rows)
+        expected = await db.select("select a, b from t where v = 'x' order by a desc, b", row_format='tuple')
+        await db.close()
+        return seen, expected
+
+    seen, expected = asyncio.run(main())
+    assert seen == expected
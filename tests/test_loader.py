@@ -0,0 +1,49 @@
+import asyncio
+
+from deebee import DB, Pool
+
+
+def test_concurrent_lookups_are_loaded_by_one_query(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}), loader_window=0)
+        await db.execute('create table t (id int primary key, v text)')
+        await db.bulk_insert('t', ({'id': i, 'v': f'v{i}'} for i in range(10)))
+        queries = []
+        db.add_hook(lambda event: queries.append(event.sql))
+        rows = await asyncio.gather(*(db.get_item('t', key='id', pk=pk) for pk in (1, 2, 2, 99)))
+        assert rows == [{'id': 1, 'v': 'v1'}, {'id': 2, 'v': 'v2'}, {'id': 2, 'v': 'v2'}, {}]
+        assert rows[1] is not rows[2]
+        assert len(queries) == 1
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_key_matching_only_as_text_is_not_found(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}), loader_window=0)
+        await db.execute('create table t (id int primary key, v text)')
+        await db.insert('t', data={'id': 1, 'v': 'x'})
+        rows = await asyncio.gather(db.get_item('t', key='id', pk=1), db.get_item('t', key='id', pk='1.0'))
+        await db.close()
+        return rows
+
+    assert asyncio.run(main()) == [{'id': 1, 'v': 'x'}, {}]
+
+
+def test_cancelled_fetch_cancels_waiting_lookups(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}), loader_window=0.05)
+        await db.execute('create table t (id int primary key)')
+        lookups = [asyncio.ensure_future(db.get_item('t', key='id', pk=pk)) for pk in (1, 2)]
+        while not db.loader.tasks:
+            await asyncio.sleep(0.001)
+        for task in list(db.loader.tasks):
+            task.cancel()
+        done, _ = await asyncio.wait(lookups, timeout=1)
+        await db.close()
+        return lookups, done
+
+    lookups, done = asyncio.run(main())
+    assert len(done) == 2
+    assert all(task.cancelled() or isinstance(task.exception(), asyncio.CancelledError) for task in lookups)
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from deebee import DB, MetricsRegistry, Pool, QueryTimeout, SlowQueryLog, prometheus_text
+from deebee.metrics import Histogram, normalize_sql
+
+
+def test_normalize_sql_collapses_values():
+    sql = "select * from t where a = 'x' and b in (1, 2, 3)"
+    assert normalize_sql(sql) == 'select * from t where a = ? and b in (?)'
+    assert normalize_sql('insert into t(a) values ($1), ($2)') == 'insert into t(a) values (?)'
+    assert normalize_sql('select  *\n from t where id = %s') == 'select * from t where id = ?'
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for i in range(1, 101):
+        histogram.add(i / 1000)
+    stats = histogram.stats()
+    assert stats['count'] == 100 and stats['max'] == 0.1
+    assert stats['p50'] == pytest.approx(0.05, rel=0.1)
+    assert stats['p99'] == pytest.approx(0.099, rel=0.1)
+
+
+def test_hooks_collect_query_and_pool_metrics():
+    async def main():
+        pool = Pool('fake')
+        db = DB(pool)
+        metrics = MetricsRegistry()
+        slow = []
+        db.add_hook(metrics)
+        db.add_hook(SlowQueryLog(threshold=0, log=slow.append))
+        pool.add_hook(metrics)
+        for i in range(3):
+            await db.select(f'select * from t where id = {i}')
+        db.timeout = 0.001
+        pool.waiting[0].con.latency = 0.1
+        with pytest.raises(QueryTimeout):
+            await db.value('select 1')
+        await db.close()
+        return metrics, slow
+
+    metrics, slow = asyncio.run(main())
+    stats = metrics.stats()
+    shape = stats['queries']['select * from t where id = ?']
+    assert shape['count'] == 3 and shape['rows'] == 3 and shape['errors'] == 0
+    assert stats['queries']['select ?']['errors'] == 1
+    assert stats['pool']['count'] == 4
+    assert len(slow) == 4 and slow[-1]['error'] is not None
+    text = prometheus_text(metrics)
+    assert 'deebee_query_seconds_count{shape="select * from t where id = ?"} 3' in text
+    assert 'deebee_pool_wait_seconds_count 4' in text
+
+
+def test_failing_hook_does_not_fail_query():
+    async def main():
+        db = DB(Pool('fake'))
+        db.add_hook(lambda event: 1 / 0)
+        value = await db.value('select 1')
+        await db.close()
+        return value
+
+    assert asyncio.run(main()) == 1
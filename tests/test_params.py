@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from benchmarks import fake
+from conftest import render
+from deebee import DB, Pool
+from deebee.db import Params
+
+
+@pytest.mark.parametrize('style, placeholders', [
+    ('format', ['%s', '%s', '%s']),
+    ('qmark', ['?', '?', '?']),
+    ('numeric', ['$1', '$2', '$3']),
+])
+def test_bind_writes_placeholder_of_style(style, placeholders):
+    params = Params(style)
+    assert [params.bind(value) for value in ('a', 2, None)] == placeholders
+    assert params.values == ['a', 2, None]
+
+
+@pytest.mark.parametrize('style, placeholder', [('format', '%s'), ('qmark', '?'), ('numeric', '$')])
+def test_where_values_are_bound_as_params(style, placeholder, executed, monkeypatch):
+    monkeypatch.setattr(fake, 'paramstyle', style)
+    fake.set_result(['id'], [])
+    where = {'a': "o'brien", 'b__in': [2, 3], 'c__bw': (4, 5), 'd__st': 'x', 'e__neq': None}
+
+    async def main():
+        db = DB(Pool('fake'))
+        await db.get_list('t', where=where, page=None)
+        await db.close()
+
+    asyncio.run(main())
+    sql, params = executed[-1]
+    assert "o'brien" not in sql and sql.count(placeholder) == 7
+    assert params == ["o'brien", 2, 3, 4, 5, 'x%', None]
+    assert render(sql, params, style) == (
+        "select * from t where a = \"o'brien\" and b in (2,3) and c between 4 and 5 and d like 'x%' and e <> None"
+    )
+
+
+def test_bound_values_round_trip(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute('create table t (id int primary key, v text)')
+        value = "it's'; drop table t; --"
+        await db.insert('t', data={'id': 1, 'v': value})
+        row = await db.get_item('t', key='id', pk=1)
+        rows = await db.get_list('t', where={'v': value}, page=None)
+        await db.close()
+        return value, row, rows
+
+    value, row, rows = asyncio.run(main())
+    assert row == {'id': 1, 'v': value}
+    assert rows == [row]
@@ -0,0 +1,121 @@
+import asyncio
+import gc
+
+import pytest
+
+from conftest import SLOW_SQL
+from deebee import DB, Pool
+
+
+def test_cancelled_task_returns_connection(database):
+    async def main():
+        pool = Pool('sqlite', params={'database': database}, max_size=1)
+        db = DB(pool)
+        task = asyncio.ensure_future(db.value(SLOW_SQL))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert pool.running == [] and pool.outstanding == 0
+        assert await asyncio.wait_for(db.value('select 1'), 1) == 1
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_db_does_not_close_shared_pool(database):
+    async def main():
+        pool = Pool('sqlite', params={'database': database})
+        assert await DB(pool).value('select 1') == 1
+        gc.collect()
+        assert not pool.closed
+        async with DB(pool).transaction() as tx:
+            await tx.value('select 1')
+        del tx
+        gc.collect()
+        assert not pool.closed
+        assert await DB(pool).value('select 2') == 2
+        await pool.close()
+
+    asyncio.run(main())
+
+
+def test_db_terminates_pool_it_created(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        shared = db.pool
+        owner = DB(backend='sqlite')
+        owned = owner.pool
+        await owner.value('select 1')
+        del owner
+        gc.collect()
+        assert owned.closed
+        assert not shared.closed
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_double_release_is_ignored():
+    async def main():
+        pool = Pool('fake', max_size=2)
+        con = await pool.acquire()
+        await pool.release(con)
+        await pool.release(con)
+        assert pool.waiting == [con] and pool.running == []
+        a = await pool.acquire()
+        b = await pool.acquire()
+        assert a is not b
+        await pool.release(a)
+        await pool.release(b)
+        await asyncio.wait_for(pool.close(), 1)
+
+    asyncio.run(main())
+
+
+def test_connections_over_max_lifetime_or_max_queries_are_replaced():
+    async def main():
+        pool = Pool('fake', max_lifetime=0.05, max_queries=2, reap_interval=60)
+        db = DB(pool)
+        await db.value('select 1')
+        first = pool.waiting[0]
+        await db.value('select 1')
+        assert first.closed and pool.waiting == []
+        await db.value('select 1')
+        second = pool.waiting[0]
+        await asyncio.sleep(0.06)
+        con = await pool.acquire()
+        assert con is not second and second.closed
+        await pool.release(con)
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_reaper_closes_idle_connections_down_to_min_size():
+    async def main():
+        pool = Pool('fake', min_size=1, max_size=3, max_idle_time=0.05)
+        connections = [await pool.acquire() for _ in range(3)]
+        for con in connections:
+            await pool.release(con)
+        assert len(pool.waiting) == 3
+        await asyncio.sleep(0.2)
+        assert pool.size == 1 and sum(con.closed for con in connections) >= 2
+        await pool.close()
+
+    asyncio.run(main())
+
+
+def test_dead_idle_connection_is_replaced_on_checkout():
+    async def main():
+        pool = Pool('fake', ping_after=0, ping_timeout=0.01)
+        con = await pool.acquire()
+        await pool.release(con)
+        con.con.latency = 1
+        fresh = await pool.acquire()
+        assert fresh is not con and con.closed
+        assert pool.running == [fresh] and pool.waiting == []
+        await pool.release(fresh)
+        await pool.close()
+
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+import asyncio
+
+from deebee import DB, Pool
+
+
+def counted(pool: Pool, name: str, served: list) -> Pool:
+    """Record name in served each time pool gives a connection."""
+    acquire = pool.acquire
+
+    async def wrapper(*args, **kwargs):
+        served.append(name)
+        return await acquire(*args, **kwargs)
+
+    pool.acquire = wrapper
+    return pool
+
+
+def test_reads_go_to_replicas_and_writes_to_primary():
+    served = []
+
+    async def main():
+        db = DB(
+            counted(Pool('fake'), 'primary', served),
+            replicas=[counted(Pool('fake'), 'a', served), counted(Pool('fake'), 'b', served)]
+        )
+        await db.value('select 1')
+        await db.select('select 1')
+        await db.execute('update t set v = 1')
+        async with db.transaction() as tx:
+            await tx.value('select 1')
+        await db.close()
+
+    asyncio.run(main())
+    assert sorted(served[:2]) == ['a', 'b']
+    assert served[2:] == ['primary', 'primary']
+
+
+def test_reads_stay_in_primary_after_write_of_the_task():
+    served = []
+
+    async def main():
+        primary = counted(Pool('fake'), 'primary', served)
+        db = DB(primary, replicas=[counted(Pool('fake'), 'replica', served)], read_your_writes=0.1)
+        other = DB(counted(Pool('fake'), 'other', served), replicas=db.replicas, read_your_writes=0.1)
+        started = asyncio.Event()
+        wrote = asyncio.Event()
+
+        async def reader():
+            started.set()
+            await wrote.wait()
+            await db.value('select 1')
+
+        task = asyncio.ensure_future(reader())
+        await started.wait()
+        await db.execute('update t set v = 1')
+        wrote.set()
+        await task
+        await db.value('select 1')
+        await other.value('select 1')
+        await asyncio.sleep(0.15)
+        await db.value('select 1')
+        await db.close()
+        await other.pool.close()
+
+    asyncio.run(main())
+    assert served == ['primary', 'replica', 'primary', 'replica', 'replica']
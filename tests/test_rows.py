@@ -0,0 +1,72 @@
+import asyncio
+import dataclasses
+
+import pytest
+
+from deebee import DB, Pool
+from deebee.rows import make_record_class, make_row, make_rows
+
+COLUMNS = ['id', 'name']
+ITEMS = [(1, 'a'), (2, 'b')]
+
+
+@dataclasses.dataclass
+class Item:
+    id: int
+    name: str
+
+
+class Keywords:
+    def __init__(self, name=None, id=None):
+        self.id = id
+        self.name = name
+
+
+def test_row_formats():
+    assert make_rows(COLUMNS, ITEMS) == [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+    assert make_rows(COLUMNS, ITEMS, 'tuple') == ITEMS
+    records = make_rows(COLUMNS, ITEMS, 'record')
+    assert records[1].name == 'b' and records == ITEMS
+    assert type(records[0]) is make_record_class(('id', 'name'))
+    assert make_rows(COLUMNS, ITEMS, 'columnar') == {'id': [1, 2], 'name': ['a', 'b']}
+    assert make_rows(COLUMNS, [], 'columnar') == {'id': [], 'name': []}
+    assert make_row(COLUMNS, ITEMS[0], 'record').id == 1
+    assert make_row(COLUMNS, None) is None
+    with pytest.raises(ValueError):
+        make_rows(COLUMNS, ITEMS, 'csv')
+    with pytest.raises(ValueError):
+        make_row(COLUMNS, ITEMS[0], 'columnar')
+
+
+def test_numpy_row_format():
+    numpy = pytest.importorskip('numpy')
+    arrays = make_rows(COLUMNS, ITEMS, 'numpy')
+    assert isinstance(arrays['id'], numpy.ndarray) and arrays['id'].tolist() == [1, 2]
+
+
+def test_models_are_built_from_rows():
+    assert make_rows(COLUMNS, ITEMS, model=Item) == [Item(1, 'a'), Item(2, 'b')]
+    assert make_rows(['name', 'id'], [('a', 1)], model=Item) == [Item(1, 'a')]
+    built = make_row(COLUMNS, ITEMS[0], model=Keywords)
+    assert (built.id, built.name) == (1, 'a')
+
+
+def test_select_row_format(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute('create table t (id int, name text)')
+        await db.bulk_insert('t', ({'id': i, 'name': n} for i, n in ITEMS))
+        sql = 'select id, name from t order by id'
+        result = (
+            await db.select(sql, row_format='tuple'),
+            await db.select(sql, row_format='columnar'),
+            await db.row(sql, row_format='record'),
+            await db.get_list('t', order='id', page=None, row_format='tuple'),
+        )
+        await db.close()
+        return result
+
+    tuples, columns, record, listed = asyncio.run(main())
+    assert tuples == ITEMS and listed == ITEMS
+    assert columns == {'id': [1, 2], 'name': ['a', 'b']}
+    assert record.name == 'a'
@@ -0,0 +1,83 @@
+import asyncio
+import datetime
+import decimal
+
+import pytest
+
+from deebee import DB, Pool
+from deebee.schema import column_kind
+
+DDL = '''create table t (
+    id integer primary key, code varchar(10) unique, data json, price numeric(10, 2), flag boolean, day date
+)'''
+
+
+@pytest.mark.parametrize('type_name, kind', [
+    ('INTEGER', 'integer'), ('character varying(20)', 'text'), ('double precision', 'float'),
+    ('timestamp with time zone', 'datetime'), ('tinyint(1)', 'boolean'), ('jsonb', 'json'), ('geometry', 'other'),
+])
+def test_column_kind(type_name, kind):
+    assert column_kind(type_name) == kind
+
+
+def test_schema_is_introspected_once_and_refreshed(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute(DDL)
+        await db.execute('create table n (a int, b int, unique (a, b))')
+        schema = await db.schema('t')
+        queries = []
+        db.add_hook(queries.append)
+        assert await db.schema('t') is schema
+        assert queries == []
+        await db.execute('alter table t add column extra text')
+        db.refresh_schema('t')
+        refreshed = await db.schema('t')
+        keyless = await db.schema('n')
+        await db.close()
+        return schema, refreshed, keyless
+
+    schema, refreshed, keyless = asyncio.run(main())
+    assert list(schema.columns) == ['id', 'code', 'data', 'price', 'flag', 'day']
+    assert schema.primary_key == ['id'] and schema.unique == [['code']] and schema.key == ['id']
+    assert 'extra' in refreshed.columns
+    assert keyless.key == ['a', 'b']
+
+
+def test_default_key_is_used_when_key_is_omitted(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute(DDL)
+        await db.execute('create table n (a int, b int, v text, unique (a, b))')
+        await db.insert('t', data={'id': 1, 'code': 'a'})
+        await db.insert('n', data={'a': 1, 'b': 2, 'v': 'x'})
+        result = (
+            await db.get_item('t', pk=1),
+            await db.update('t', pk=1, data={'id': 1, 'code': 'b'}),
+            await db.apply('n', data={'a': 1, 'b': 2, 'v': 'y'}),
+            await db.get_item('n', pk=(1, 2)),
+            await db.delete('n', pk=(1, 2)),
+        )
+        await db.close()
+        return result
+
+    item, updated, applied, composite, deleted = asyncio.run(main())
+    assert item['code'] == 'a' and updated['code'] == 'b'
+    assert applied == composite == deleted == {'a': 1, 'b': 2, 'v': 'y'}
+
+
+def test_typed_db_encodes_and_decodes_values(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}), typed=True)
+        await db.execute(DDL)
+        row = {'id': 1, 'code': 'a', 'data': {'k': [1, 2]}, 'price': decimal.Decimal('1.50'), 'flag': True,
+               'day': datetime.date(2024, 1, 2)}
+        inserted = await db.insert('t', data=row)
+        found = await db.get_list('t', where={'day__gte': datetime.date(2024, 1, 1)}, page=None)
+        raw = await db.row('select data, day from t')
+        await db.close()
+        return row, inserted, found, raw
+
+    row, inserted, found, raw = asyncio.run(main())
+    assert inserted == row and found == [row]
+    assert raw == {'data': '{"k": [1, 2]}', 'day': '2024-01-02'}
@@ -0,0 +1,42 @@
+import asyncio
+
+from deebee import DB, Pool
+
+
+def test_same_shape_reuses_compiled_sql(executed):
+    async def main():
+        db = DB(Pool('fake'))
+        await db.get_list('t', where={'a': 1, 'b__in': [1, 2]}, page=None)
+        await db.get_list('t', where={'a': 2, 'b__in': [3, 4]}, page=None)
+        assert db.shapes.stats()['misses'] == 1 and db.shapes.hits == 1
+        await db.get_list('t', where={'a': 2, 'b__in': [3, 4, 5]}, page=None)
+        await db.get_list('t', where={'a__gt': 2}, page=None)
+        await db.get_list('u', where={'a': 2}, page=None)
+        assert db.shapes.misses == 4 and db.shapes.hits == 1
+        await db.count('t', where={'a': 3})
+        await db.count('t', where={'a': 4})
+        await db.get_item('t', key='id', pk=1)
+        await db.get_item('t', key='id', pk=2)
+        await db.insert('t', data={'id': 1, 'v': 'x'})
+        await db.insert('t', data={'id': 2, 'v': 'y'})
+        assert db.shapes.misses == 7 and db.shapes.hits == 4
+        await db.close()
+
+    asyncio.run(main())
+    sql = [s for s, _ in executed]
+    assert sql[0] == sql[1] != sql[2]
+    assert sql[5] == sql[6] and sql[7] == sql[8] and sql[9] == sql[10]
+    assert [p for _, p in executed[:2]] == [[1, 1, 2], [2, 3, 4]]
+
+
+def test_shape_cache_is_bounded(executed):
+    async def main():
+        db = DB(Pool('fake'), shape_cache_size=2)
+        for column in 'abc':
+            await db.count('t', where={column: 1})
+        assert len(db.shapes) == 2
+        await db.count('t', where={'a': 1})
+        assert db.shapes.misses == 4
+        await db.close()
+
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+import asyncio
+import contextlib
+
+from deebee import DB, Pool
+from deebee.connectors import postgresql
+
+
+def test_iterate_yields_batches(database):
+    async def main():
+        pool = Pool('sqlite', params={'database': database}, max_size=1)
+        db = DB(pool)
+        await db.execute('create table t (id int)')
+        await db.bulk_insert('t', ({'id': i} for i in range(25)))
+        sizes = [len(rows) async for rows in db.iterate('select * from t', batch_size=10)]
+        assert sizes == [10, 10, 5]
+        ids = [row['id'] async for row in db.stream('select * from t order by id', batch_size=4)]
+        assert ids == list(range(25))
+        async with contextlib.aclosing(db.stream('select * from t', batch_size=4)) as rows:
+            async for _ in rows:
+                break
+        assert pool.running == []
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_nested_postgresql_streams_use_distinct_cursors(monkeypatch):
+    statements = []
+
+    class Cursor:
+        description = [('id', None)]
+
+        def __init__(self):
+            self.rows = []
+
+        async def execute(self, sql, params=None):
+            statements.append(sql)
+            self.rows = [(1,), (2,)] if sql.startswith('fetch') and statements.count(sql) == 1 else []
+
+        async def fetchall(self):
+            return self.rows
+
+        async def close(self):
+            pass
+
+    async def cursor(con):
+        return Cursor()
+
+    monkeypatch.setattr(postgresql, 'cursor', cursor)
+    monkeypatch.setattr(postgresql, 'in_transaction', lambda con: True)
+
+    async def main():
+        pairs = []
+        async for _, outer in postgresql.stream(None, 'select 1', [], 2):
+            async for _, inner in postgresql.stream(None, 'select 2', [], 2):
+                pairs.append((outer, inner))
+        return pairs
+
+    assert len(asyncio.run(main())) == 1
+    declared = [sql.split()[1] for sql in statements if sql.startswith('declare')]
+    assert len(declared) == 2 and declared[0] != declared[1]
+    assert sorted(sql.split()[1] for sql in statements if sql.startswith('close')) == sorted(declared)
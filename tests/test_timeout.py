@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from benchmarks import fake
+from conftest import SLOW_SQL
+from deebee import DB, Pool, QueryTimeout
+from deebee.connectors import sqlite
+
+
+def test_timeout_cancels_and_returns_connection(database):
+    async def main():
+        pool = Pool('sqlite', params={'database': database}, max_size=1)
+        db = DB(pool, timeout=0.05)
+        with pytest.raises(QueryTimeout):
+            await db.value(SLOW_SQL)
+        assert pool.running == [] and pool.outstanding == 0
+        assert await db.value('select 1') == 1
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_timeout_of_helper_statement_is_rolled_back(database):
+    async def main():
+        pool = Pool('sqlite', params={'database': database})
+        db = DB(pool)
+        await db.execute('create table t (id int primary key, v text)')
+        await db.bulk_insert('t', ({'id': i, 'v': 'x'} for i in range(200000)), chunk_size=200000)
+        events = []
+        db.add_hook(events.append)
+        db.timeout = 0.001
+        with pytest.raises(QueryTimeout):
+            await db.bulk_update('t', ({'id': i, 'v': 'y'} for i in range(200000)), key='id', chunk_size=200000)
+        db.timeout = None
+        assert any(isinstance(event.error, QueryTimeout) for event in events)
+        assert pool.running == []
+        assert await db.value("select count(*) from t where v = 'y'") == 0
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_timeout_without_connector_cancel_discards_connection():
+    async def main():
+        pool = Pool('fake', params={'latency': 1}, max_size=2)
+        db = DB(pool, timeout=0.01)
+        with pytest.raises(QueryTimeout):
+            await db.value('select 1')
+        assert pool.running == [] and pool.waiting == []
+        db.timeout = None
+        pool.params['latency'] = 0
+        assert await db.value('select 1') == 1
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_timeout_covers_prepare(monkeypatch):
+    async def prepare(con, name, sql):
+        await asyncio.sleep(1)
+        return sql
+
+    monkeypatch.setattr(fake, 'prepare', prepare, raising=False)
+
+    async def main():
+        pool = Pool('fake')
+        db = DB(pool, timeout=0.01)
+        with pytest.raises(QueryTimeout):
+            await db.get_item('t', key='id', pk=1)
+        assert pool.running == []
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_sqlite_cancel_gives_up_on_statement_not_interrupted():
+    class Stuck:
+        def __init__(self):
+            self.never = asyncio.Event()
+
+        async def interrupt(self):
+            pass
+
+        async def execute(self, sql):
+            await self.never.wait()
+
+    async def main():
+        with pytest.raises(Exception, match='could not be interrupted'):
+            await sqlite.cancel(Stuck(), None, {})
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(main()) == []
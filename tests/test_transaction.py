@@ -0,0 +1,20 @@
+import asyncio
+
+import pytest
+
+from deebee import DB, Pool
+
+
+def test_pinned_connection_is_released_with_context(database):
+    async def main():
+        pool = Pool('sqlite', params={'database': database})
+        db = DB(pool)
+        async with db.transaction() as tx:
+            assert await tx.value('select 1') == 1
+            assert len(pool.running) == 1
+        assert pool.running == [] and not tx.pinned
+        with pytest.raises(Exception, match='released'):
+            await tx.value('select 1')
+        await db.close()
+
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from deebee import DB, Pool
+
+
+def test_failed_rows_are_reported_and_others_written(database):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        await db.execute('create table t (id int primary key, v text not null)')
+        await db.insert('t', data={'id': 10, 'v': 'x'})
+        errors = []
+        rows = [{'id': i, 'v': None if i == 30 else 'y'} for i in range(64)]
+        async with db.writer('t', max_batch=16, on_error=lambda row, e: errors.append((row['id'], e))) as w:
+            futures = [await w.write(row) for row in rows]
+        assert sorted(i for i, _ in errors) == [10, 30]
+        assert all(isinstance(e, sqlite3.IntegrityError) for _, e in errors)
+        assert isinstance(futures[10].exception(), sqlite3.IntegrityError)
+        assert futures[11].result() is None
+        assert w.written == 62 and w.failed == 2
+        assert await db.value("select count(*) from t where v = 'y'") == 62
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_errors_not_caused_by_rows_fail_whole_batch(database, monkeypatch):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        calls = []
+        bulk_insert = db.bulk_insert
+
+        async def counted(*args, **kwargs):
+            calls.append(1)
+            return await bulk_insert(*args, **kwargs)
+
+        monkeypatch.setattr(db, 'bulk_insert', counted)
+        errors = []
+        async with db.writer('missing', max_batch=100, on_error=lambda row, e: errors.append(e)) as w:
+            futures = [await w.write({'id': i}) for i in range(100)]
+        assert len(calls) == 1
+        assert len(errors) == 100 and w.failed == 100 and w.written == 0
+        assert all(isinstance(future.exception(), sqlite3.OperationalError) for future in futures)
+        await db.close()
+
+    asyncio.run(main())
+
+
+def test_write_waits_for_room_when_pending_rows_are_full(database, monkeypatch):
+    async def main():
+        db = DB(Pool('sqlite', params={'database': database}))
+        release = asyncio.Event()
+        inserted = []
+
+        async def blocked(table, rows, **kwargs):
+            await release.wait()
+            inserted.extend(rows)
+
+        monkeypatch.setattr(db, 'bulk_insert', blocked)
+        w = db.writer('t', max_batch=2, max_delay=0, max_pending=4)
+        for i in range(4):
+            await w.write({'id': i})
+        fifth = asyncio.ensure_future(w.write({'id': 4}))
+        await asyncio.sleep(0.05)
+        assert not fifth.done()
+        release.set()
+        await asyncio.wait_for(fifth, 1)
+        await w.close()
+        assert [row['id'] for row in inserted] == [0, 1, 2, 3, 4]
+        with pytest.raises(Exception, match='closed'):
+            await w.write({'id': 5})
+        await db.close()
+
+    asyncio.run(main())